@@ -1,22 +1,104 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+import sys
 import json
+import io
 import os
 import time
-from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-import yaml
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError, as_completed, wait, FIRST_COMPLETED
 import threading
+from collections import deque
 import logging
 import re
-from logging.handlers import TimedRotatingFileHandler
+import random
+import sqlite3
+import zipfile
+import shutil
+import html
+import uuid
+import hashlib
+import asyncio
+import queue
+import argparse
+import contextlib
+import copy
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+import atexit
 
 CONFIG_PATH = "./config/comic.yaml"
-API_ADDER = "api.2025copy.com"
+CHAPTER_INDEX_PATH = "./cache/chapter_index.db"
+API_CACHE_PATH = "./cache/api_cache.db" #不放在config目录，避免随配置提交到仓库
+STATE_DB_PATH = "./cache/state.db" #只提交state.yaml快照，数据库不提交到仓库
+STATE_SNAPSHOT_PATH = "./config/state.yaml"
+PAGE_STORE_DIR = "./page_store"
+PACK_DIR = "./comic_pack"
+REPORT_DIR = "./reports" #运行报告目录，不提交到仓库(GitHub Actions中作为工件上传)
+PACK_PREFIX = "comic_part"
+PACK_MANIFEST = "manifest.json"
+# API地址与图片服务器可通过环境变量覆盖（用于镜像站或本地基准测试）
+API_SCHEME = os.getenv("MKK_API_SCHEME", "https")
+API_ADDER = os.getenv("MKK_API_ADDER", "api.2025copy.com")
+IMAGE_HOST = os.getenv("MKK_IMAGE_HOST") #如 http://127.0.0.1:8001，替换图片URL的协议和域名，None为使用接口返回的地址
 pdf_switch = 1
 pdf_password=None
+output_format = None #输出格式(pdf/cbz/epub/none)，None时由pdf_switch决定
+transcode = None #电子阅读器转码参数(None为不转码)
+pack_max_mb = 45 #打包时单个压缩包的大小上限(MB)，与邮件附件上限一致
+download_workers = 5 #下载线程数(同时决定每个域名的连接池大小)
+http_connect_timeout = 10 #连接超时(秒)
+http_read_timeout = 30 #读取超时(秒)
+rate_limit_initial = 10 #每个域名初始请求速率(次/秒)，根据响应自动调整
+rate_limit_min = 1 #每个域名最低请求速率(次/秒)
+rate_limit_max = 50 #每个域名最高请求速率(次/秒)
+hedge_switch = 0 #是否对慢图片发起对冲请求(1为开启)，超过近期每页耗时p95仍未完成时再请求一次，使用先完成的结果
+hedge_ratio = 0.1 #对冲请求数占图片请求数的上限
+hedge_min_delay = 0.5 #对冲阈值下限(秒)
+CHAPTER_PAGE_LIMIT = 50 #章节列表每页数量
+chapter_index_switch = 1 #是否使用本地章节索引(1为使用，0为每次请求章节列表)
+report_switch = 1 #是否在运行结束后输出JSON运行报告到reports目录(1为输出)
+metrics_textfile = None #Prometheus textfile输出路径(None为不输出)
+page_store_switch = 0 #是否使用内容寻址图片存储(1为开启)，相同图片只保存一份，章节目录中为硬链接
+api_cache_switch = 1 #是否缓存API响应(1为缓存)
+api_cache_mb = 64 #API响应缓存的大小上限(MB)，超出时淘汰最久未使用的响应
+# 各接口API响应缓存的有效期(秒)
+API_CACHE_TTL = {
+    "search": 600,
+    "comic2": 300,
+    "chapters": 300,
+    "chapter2": 7 * 24 * 3600,
+}
+pipeline_switch = 1 #是否流水线处理章节(1为开启，0为逐章节顺序处理)
+pipeline_queue_size = 2 #流水线每个阶段的队列长度
+output_workers = 0 #输出转换(PDF等)进程数，0为CPU核数
+download_engine = "thread" #图片下载引擎(thread为线程池，async为asyncio+aiohttp，aiohttp为可选依赖)
+async_concurrency = 64 #async引擎全局并发请求数(所有章节共享)
+async_max_inflight_mb = 64 #async引擎内存中未写盘图片的字节上限(MB)
+update_check_workers = 16 #检查更新时并发检查的漫画数
+quick_check_switch = 1 #检查更新时是否先用comic2接口(条件请求)跳过未变化的漫画(1为开启)
+plan_switch = 0 #是否先生成所有漫画的下载计划并按字节预算分配(1为开启)
+download_budget_mb = 0 #单次运行所有漫画的下载字节预算(MB)，0为不限制
+plan_page_kb = 300 #估算下载量时每张图片的平均大小(KB)
+plan_speed_mb = 2 #估算下载耗时使用的下载速度(MB/s)
+log_format = os.environ.get("MKK_LOG_FORMAT", "text") #日志文件格式(text为文本，json为每行一条JSON)，环境变量MKK_LOG_FORMAT优先于配置文件
+
+# CopyManga客户端请求头，由会话统一设置
+COPY_HEADERS = {
+    "User-Agent": "COPY/3.0.0",
+    "Accept": "application/json",
+    "version": "2025.08.15",
+    "platform": "1",
+    "webp": "1",
+    "region": "1"
+}
+
+# 主程序中由setup_rotating_logger配置，进程池子进程中使用默认配置
+logger = logging.getLogger("mkk_comic")
+log_listener = None #后台日志线程，由setup_rotating_logger启动
 
 class Color:
     """ANSI颜色代码类"""
@@ -64,6 +146,176 @@ class Color:
     BG_BRIGHT_CYAN = "\033[106m"
     BG_BRIGHT_WHITE = "\033[107m"
 
+class JsonFormatter(logging.Formatter):
+    """紧凑JSON日志格式（每行一条，便于日志系统采集）"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "location": f"{record.filename}:{record.lineno}",
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class LogQueueHandler(QueueHandler):
+    """
+    放入日志队列前只合并消息参数，异常堆栈单独保存在exc_text中，
+    由文件/控制台各自的Formatter输出（默认的QueueHandler会把堆栈拼进消息，JSON日志中丢失exception字段）
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class DownloadProgress:
+    """
+    下载进度汇总：按章节统计已完成的页数，替代逐页日志
+    控制台为终端时在最后一行绘制所有下载中章节的汇总进度条，章节完成时由调用方输出一行汇总日志
+    """
+    BAR_WIDTH = 30
+    REFRESH_INTERVAL = 0.2 #进度条最短重绘间隔(秒)
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stderr
+        self.enabled = self.stream is not None and hasattr(self.stream, "isatty") and self.stream.isatty()
+        self.lock = threading.RLock()
+        self._chapters = {} #章节输出目录 -> [总页数, 已完成页数, 失败页数, 开始时间]
+        self._shown = False
+        self._last_draw = 0.0
+
+    def start(self, key, total):
+        with self.lock:
+            self._chapters[key] = [total, 0, 0, time.perf_counter()]
+            self.draw()
+
+    def advance(self, key, count=1, failed=False):
+        """记录章节完成count页（跳过、链接的页面也计入）"""
+        with self.lock:
+            chapter = self._chapters.get(key)
+            if chapter is None:
+                return
+            chapter[1] += count
+            if failed:
+                chapter[2] += count
+            self.draw()
+
+    def finish(self, key):
+        """
+        结束章节的进度统计
+        :return: 章节下载耗时(秒)，未登记的章节返回0
+        """
+        with self.lock:
+            chapter = self._chapters.pop(key, None)
+            self.draw(force=True)
+        return time.perf_counter() - chapter[3] if chapter else 0.0
+
+    def draw(self, force=False):
+        """重绘进度条（非终端或没有下载中的章节时不显示）"""
+        if not self.enabled:
+            return
+        with self.lock:
+            if not self._chapters:
+                self.clear()
+                return
+            now = time.monotonic()
+            if not force and now - self._last_draw < self.REFRESH_INTERVAL:
+                return
+            self._last_draw = now
+            total = sum(chapter[0] for chapter in self._chapters.values())
+            done = sum(chapter[1] for chapter in self._chapters.values())
+            failed = sum(chapter[2] for chapter in self._chapters.values())
+            filled = int(self.BAR_WIDTH * done / total) if total else self.BAR_WIDTH
+            line = f"下载中 [{'#' * filled}{'.' * (self.BAR_WIDTH - filled)}] {done}/{total} 页 · {len(self._chapters)} 个章节"
+            if failed:
+                line += f" · 失败 {failed} 页"
+            try:
+                self.stream.write("\r\033[K" + line)
+                self.stream.flush()
+            except (OSError, ValueError):
+                self.enabled = False
+                return
+            self._shown = True
+
+    def clear(self):
+        """擦除进度条所在行"""
+        with self.lock:
+            if not self._shown:
+                return
+            self._shown = False
+            try:
+                self.stream.write("\r\033[K")
+                self.stream.flush()
+            except (OSError, ValueError):
+                self.enabled = False
+
+download_progress = DownloadProgress()
+
+class ConsoleHandler(logging.StreamHandler):
+    """控制台Handler：输出日志前先擦除下载进度条，输出后重新绘制"""
+
+    def emit(self, record):
+        with download_progress.lock:
+            download_progress.clear()
+            super().emit(record)
+            download_progress.draw(force=True)
+
+def make_log_formatter(fmt):
+    """按日志格式(text/json)创建Formatter"""
+    if fmt == "json":
+        return JsonFormatter()
+    return logging.Formatter(
+        "%(asctime)s - %(name)s - %(filename)s:%(lineno)d - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+def configure_log_format(fmt):
+    """切换日志文件格式（控制台始终为文本格式）"""
+    if log_listener is None:
+        return
+    for handler in log_listener.handlers:
+        if isinstance(handler, TimedRotatingFileHandler):
+            handler.setFormatter(make_log_formatter(fmt))
+
+def stop_logging():
+    """停止后台日志线程（写完队列中剩余的日志）"""
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+        download_progress.clear()
+
+def init_output_process():
+    """
+    进程池子进程初始化：fork出的子进程中没有后台日志线程，
+    改为直接使用文件和控制台Handler，避免日志留在队列中丢失
+    父进程的进度条不在子进程中使用：fork时它的锁可能正被下载线程持有，沿用会使子进程第一次输出日志时死锁
+    """
+    global download_progress
+    download_progress = DownloadProgress()
+    download_progress.enabled = False
+    if log_listener is not None:
+        handlers = []
+        for handler in log_listener.handlers:
+            if isinstance(handler, ConsoleHandler):
+                console_handler = logging.StreamHandler()
+                console_handler.setLevel(handler.level)
+                console_handler.setFormatter(handler.formatter)
+                handler = console_handler
+            handlers.append(handler)
+        logger.handlers = handlers
+
 def setup_rotating_logger():
     # 1. 创建日志器（命名为项目名，避免与其他日志器冲突）
     logger = logging.getLogger("mkk_comic")
@@ -87,7 +339,7 @@ def setup_rotating_logger():
         interval=1,                 # 每1天轮转一次
         backupCount=7,              # 保留7个备份文件（超过自动删除）
         encoding='utf-8',           # 中文编码，避免乱码
-        delay=False,                # 立即创建日志文件
+        delay=True,                 # 第一条日志写入时才创建日志文件
         utc=True                   # 使用本地时间（True则用UTC时间）
     )
 
@@ -96,24 +348,498 @@ def setup_rotating_logger():
     # 过滤非日期后缀的文件（避免删除其他文件）
     file_handler.extMatch = re.compile(r"^\d{4}-\d{2}-\d{2}(\.\w+)?$")
 
-    # 4. 创建控制台Handler
-    console_handler = logging.StreamHandler()
+    # 4. 创建控制台Handler（与下载进度条共用一行时先擦除进度条）
+    console_handler = ConsoleHandler()
     console_handler.setLevel(logging.INFO)  # 控制台只输出INFO及以上
 
-    # 5. 定义日志格式（包含时间、模块、行号等关键信息）
-    log_formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(filename)s:%(lineno)d - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-    file_handler.setFormatter(log_formatter)
-    console_handler.setFormatter(log_formatter)
+    # 5. 定义日志格式（包含时间、模块、行号等关键信息；日志文件可选JSON格式）
+    file_handler.setFormatter(make_log_formatter(log_format))
+    console_handler.setFormatter(make_log_formatter("text"))
 
-    # 6. 将Handler添加到日志器
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # 6. 日志器只把记录放入队列，由后台线程写文件和控制台，下载线程不等待磁盘IO
+    global log_listener
+    stop_logging()
+    log_listener = QueueListener(queue.SimpleQueue(), file_handler, console_handler, respect_handler_level=True)
+    logger.addHandler(LogQueueHandler(log_listener.queue))
+    log_listener.start()
+    atexit.register(stop_logging)
 
     return logger
 
+def parse_retry_after(value):
+    """解析Retry-After响应头（秒数或HTTP日期），无法解析返回None"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """指数退避+全抖动：第attempt次重试的等待秒数"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class HostRateLimiter:
+    """
+    单个域名的自适应限速器（令牌桶 + AIMD）
+    - 响应正常时速率线性增加，遇到429/5xx/超时速率减半
+    - 遵循Retry-After，在指定时间前暂停该域名的所有请求
+    """
+
+    def __init__(self, rate, min_rate, max_rate):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        预约一个请求令牌
+        :return: 发出请求前需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            burst = max(self.rate, 1.0)
+            self.tokens = min(burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 1.0 / max(self.rate, 1.0))
+
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+class RateLimiter:
+    """按域名划分的自适应限速器，HTTP客户端与async下载引擎共用"""
+
+    def __init__(self, rate=10.0, min_rate=1.0, max_rate=50.0):
+        self.configure(rate, min_rate, max_rate)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def configure(self, rate=None, min_rate=None, max_rate=None):
+        self.initial_rate = rate if rate is not None else self.initial_rate
+        self.min_rate = min_rate if min_rate is not None else self.min_rate
+        self.max_rate = max_rate if max_rate is not None else self.max_rate
+
+    def host(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            limiter = self._hosts.get(host)
+            if limiter is None:
+                limiter = HostRateLimiter(self.initial_rate, self.min_rate, self.max_rate)
+                self._hosts[host] = limiter
+            return limiter
+
+    def feedback(self, url, status=None, retry_after=None):
+        """
+        根据请求结果调整速率
+        :param status: HTTP状态码，None表示超时/连接错误
+        """
+        limiter = self.host(url)
+        if status is None or status == 429 or status >= 500:
+            limiter.on_throttle(retry_after)
+        else:
+            limiter.on_success()
+
+    def log_stats(self):
+        with self._lock:
+            hosts = list(self._hosts.items())
+        for host, limiter in hosts:
+            logger.info(f"限速统计[{host}]: 当前速率 {limiter.rate:.1f} 次/秒，触发限流 {limiter.throttled} 次")
+
+rate_limiter = RateLimiter(rate_limit_initial, rate_limit_min, rate_limit_max)
+
+class _CountingAdapter(HTTPAdapter):
+    """统计真实建立TCP连接次数的适配器（连接池未命中次数）"""
+
+    def __init__(self, on_connect, **kwargs):
+        self._on_connect = on_connect
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        on_connect = self._on_connect
+
+        def counting(conn_cls):
+            class CountingConnection(conn_cls):
+                def connect(self):
+                    on_connect()
+                    super().connect()
+            return CountingConnection
+
+        class CountingHTTPPool(HTTPConnectionPool):
+            ConnectionCls = counting(HTTPConnection)
+
+        class CountingHTTPSPool(HTTPSConnectionPool):
+            ConnectionCls = counting(HTTPSConnection)
+
+        self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPPool, "https": CountingHTTPSPool}
+
+class HttpClient:
+    """
+    共享HTTP客户端：每个域名一个requests.Session
+    - 连接池大小与下载线程数一致，保持长连接复用
+    - 请求头统一设置一次
+    - 统计连接池命中(复用连接)/未命中(新建连接)次数
+    """
+
+    def __init__(self, pool_size=5, connect_timeout=10, read_timeout=30):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def configure(self, pool_size=None, connect_timeout=None, read_timeout=None):
+        """修改连接池大小与超时，连接池大小变化时重建会话"""
+        with self._lock:
+            if connect_timeout is not None or read_timeout is not None:
+                self.timeout = (connect_timeout or self.timeout[0], read_timeout or self.timeout[1])
+            if pool_size is not None and pool_size != self.pool_size:
+                self.pool_size = pool_size
+                for session in self._sessions.values():
+                    session.close()
+                self._sessions.clear()
+
+    def _count(self, host, key):
+        with self._lock:
+            self._stats[host][key] += 1
+
+    def session(self, url):
+        """获取URL所属域名的会话（不存在则创建）"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                session.headers.update(COPY_HEADERS)
+                self._stats.setdefault(host, {"requests": 0, "misses": 0})
+                adapter = _CountingAdapter(lambda: self._count(host, "misses"),
+                                           pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def get(self, url, **kwargs):
+        """发送GET请求（经过限速器，并将响应结果反馈给限速器）"""
+        kwargs.setdefault("timeout", self.timeout)
+        session = self.session(url)
+        rate_limiter.host(url).acquire()
+        self._count(urlsplit(url).netloc, "requests")
+        try:
+            response = session.get(url, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            rate_limiter.feedback(url)
+            raise
+        rate_limiter.feedback(url, response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+        return response
+
+    def stats(self):
+        """
+        连接池统计
+        :return: {域名: {"requests": 请求数, "hits": 复用连接次数, "misses": 新建连接次数}}
+        """
+        with self._lock:
+            return {
+                host: {
+                    "requests": item["requests"],
+                    "hits": max(item["requests"] - item["misses"], 0),
+                    "misses": item["misses"],
+                }
+                for host, item in self._stats.items()
+            }
+
+    def log_stats(self):
+        for host, item in self.stats().items():
+            logger.info(f"连接池统计[{host}]: 请求 {item['requests']} 次，复用 {item['hits']} 次，新建连接 {item['misses']} 次")
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+http_client = HttpClient(download_workers, http_connect_timeout, http_read_timeout)
+
+class ByteCounter:
+    """线程安全的字节计数器"""
+
+    def __init__(self):
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def add(self, size):
+        with self._lock:
+            self.total += size
+
+class RunMetrics:
+    """
+    运行统计：各阶段耗时(直方图)、事件计数(重试/失败原因等)、每部漫画耗时
+    运行结束后输出JSON报告，可选输出Prometheus textfile
+    """
+    BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self):
+        self.started = time.time()
+        self._spans = {}
+        self._counters = {}
+        self._comics = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        """记录一次耗时(秒)"""
+        with self._lock:
+            self._spans.setdefault(name, []).append(seconds)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """统计代码块耗时: with metrics.span("名称"):"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def count(self, name, label="", value=1):
+        """事件计数，label用于区分原因(如失败原因)"""
+        with self._lock:
+            key = (name, label)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_comic(self, name, seconds, chapters, success):
+        """记录一部漫画的下载耗时、处理章节数和成功章节数"""
+        with self._lock:
+            self._comics[name] = {"seconds": round(seconds, 3), "chapters": chapters, "success": success}
+
+    @staticmethod
+    def percentile(samples, q):
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def summary(self):
+        """生成报告内容"""
+        duration = time.time() - self.started
+        with self._lock:
+            spans = {name: sorted(samples) for name, samples in self._spans.items()}
+            counters = dict(self._counters)
+            comics = dict(self._comics)
+        report_spans = {}
+        for name, samples in spans.items():
+            report_spans[name] = {
+                "count": len(samples),
+                "sum": round(sum(samples), 3),
+                "p50": round(self.percentile(samples, 0.50), 4),
+                "p95": round(self.percentile(samples, 0.95), 4),
+                "p99": round(self.percentile(samples, 0.99), 4),
+                "max": round(samples[-1], 4),
+                "buckets": {str(le): sum(1 for sample in samples if sample <= le) for le in self.BUCKETS},
+            }
+        report_counters = {}
+        for (name, label), value in counters.items():
+            report_counters.setdefault(name, {})[label or "total"] = value
+        return {
+            "started_at": datetime.fromtimestamp(self.started).strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_seconds": round(duration, 3),
+            "downloaded_bytes": downloaded_bytes.total,
+            "throughput_mb_s": round(downloaded_bytes.total / 1024 / 1024 / duration, 3) if duration else 0,
+            "spans": report_spans,
+            "counters": report_counters,
+            "comics": comics,
+            "connections": http_client.stats(),
+        }
+
+    def write_report(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, json.dumps(self.summary(), ensure_ascii=False, indent=2).encode("utf-8"))
+        logger.info(f"运行报告已保存 → {path}")
+
+    def write_textfile(self, path):
+        """输出Prometheus textfile(供node_exporter的textfile收集器读取)"""
+        def label(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+        report = self.summary()
+        with self._lock:
+            spans = {name: list(samples) for name, samples in self._spans.items()}
+        lines = ["# TYPE mkk_comic_span_seconds histogram"]
+        for name, samples in spans.items():
+            for le in self.BUCKETS:
+                lines.append(f'mkk_comic_span_seconds_bucket{{span="{label(name)}",le="{le}"}} '
+                             f'{sum(1 for sample in samples if sample <= le)}')
+            lines.append(f'mkk_comic_span_seconds_bucket{{span="{label(name)}",le="+Inf"}} {len(samples)}')
+            lines.append(f'mkk_comic_span_seconds_sum{{span="{label(name)}"}} {sum(samples)}')
+            lines.append(f'mkk_comic_span_seconds_count{{span="{label(name)}"}} {len(samples)}')
+        lines.append("# TYPE mkk_comic_events_total counter")
+        for name, values in report["counters"].items():
+            for cause, value in values.items():
+                lines.append(f'mkk_comic_events_total{{event="{label(name)}",cause="{label(cause)}"}} {value}')
+        lines.append("# TYPE mkk_comic_comic_seconds gauge")
+        for name, item in report["comics"].items():
+            lines.append(f'mkk_comic_comic_seconds{{comic="{label(name)}"}} {item["seconds"]}')
+        lines.append("# TYPE mkk_comic_downloaded_bytes gauge")
+        lines.append(f"mkk_comic_downloaded_bytes {report['downloaded_bytes']}")
+        lines.append("# TYPE mkk_comic_run_duration_seconds gauge")
+        lines.append(f"mkk_comic_run_duration_seconds {report['duration_seconds']}")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        atomic_write(path, ("\n".join(lines) + "\n").encode("utf-8"))
+
+metrics = RunMetrics()
+
+def failure_cause(error=None, status=None):
+    """将失败原因归类为有限的几种（用于统计）"""
+    if status is not None:
+        return f"http_{status}"
+    if isinstance(error, (requests.exceptions.Timeout, asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    if isinstance(error, (requests.exceptions.ConnectionError, ConnectionError)):
+        return "connection"
+    return type(error).__name__
+
+class ApiCache:
+    """
+    API响应缓存(SQLite)：以URL和请求参数为键保存JSON响应
+    - 每个接口单独设置有效期(章节图片信息基本不变，有效期长；漫画简介与章节列表有效期短)
+    - 总大小超过上限时淘汰最久未使用的响应
+    - 统计命中/未命中次数
+    """
+
+    def __init__(self, db_path, max_bytes, ttl):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl = dict(ttl)
+        self.enabled = True
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def configure(self, enabled=None, max_bytes=None, ttl=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if ttl:
+                self.ttl.update(ttl)
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+            """)
+        return self._conn
+
+    def _count(self, endpoint, key):
+        item = self._stats.setdefault(endpoint, {"hits": 0, "misses": 0, "evictions": 0})
+        item[key] += 1
+
+    @staticmethod
+    def make_key(url, params=None):
+        if not params:
+            return url
+        return url + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+    def _load(self, endpoint, key):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT body, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or time.time() - row[1] > self.ttl.get(endpoint, 0):
+                self._count(endpoint, "misses")
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self._count(endpoint, "hits")
+            return json.loads(row[0])
+
+    def _save(self, endpoint, key, body):
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            conn.execute("INSERT OR REPLACE INTO responses (key, endpoint, body, size, created, accessed) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", (key, endpoint, body, len(body), now, now))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute("SELECT key, endpoint, size FROM responses ORDER BY accessed").fetchall()
+                for old_key, old_endpoint, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    self._count(old_endpoint, "evictions")
+                    total -= size
+            conn.commit()
+
+    def get(self, endpoint, url, params=None, refresh=False):
+        """
+        获取API的JSON响应，缓存有效时不发送请求
+        只缓存code为200的响应；请求失败时抛出与直接请求相同的异常
+        :param refresh: 为True时忽略已有缓存，重新请求并更新缓存
+        """
+        if not self.enabled or self.ttl.get(endpoint, 0) <= 0:
+            return self._fetch(endpoint, url, params).json()
+        key = self.make_key(url, params)
+        data = None if refresh else self._load(endpoint, key)
+        if data is not None:
+            return data
+        response = self._fetch(endpoint, url, params)
+        data = response.json()
+        if isinstance(data, dict) and data.get("code") == 200:
+            self._save(endpoint, key, response.content)
+        return data
+
+    @staticmethod
+    def _fetch(endpoint, url, params):
+        with metrics.span(f"api.{endpoint}"):
+            response = http_client.get(url, params=params)
+        response.raise_for_status()
+        return response
+
+    def invalidate(self, endpoint, url, params=None):
+        """删除指定请求的缓存"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses WHERE key = ?", (self.make_key(url, params),))
+            conn.commit()
+
+    def log_stats(self):
+        with self._lock:
+            stats = {endpoint: dict(item) for endpoint, item in self._stats.items()}
+        for endpoint, item in stats.items():
+            logger.info(f"API缓存统计[{endpoint}]: 命中 {item['hits']} 次，未命中 {item['misses']} 次，"
+                        f"淘汰 {item['evictions']} 条")
+
+api_cache = ApiCache(API_CACHE_PATH, api_cache_mb * 1024 * 1024, API_CACHE_TTL)
+
 def clear_terminal():
     """清除终端屏幕"""
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -164,22 +890,13 @@ def print_separate():
 
 def search_copy_manga(keyword, page_num=1):
     """
-    使用CopyManga客户端的请求头搜索漫画
+    使用CopyManga客户端的请求头搜索漫画（请求头由共享会话统一设置）
     参数:
         keyword (str): 搜索关键词
         page_num (int): 页码，默认第1页
     返回:
         dict: 解析后的JSON响应数据
     """
-    # 定义请求头（与CopyManga客户端完全一致）
-    headers = {
-        "User-Agent": "COPY/3.0.0",
-        "Accept": "application/json",
-        "version": "2025.08.15",
-        "platform": "1",
-        "webp": "1",
-        "region": "1"
-    }
 
     # 定义请求参数
     limit = 5 #每次获取n个
@@ -192,14 +909,10 @@ def search_copy_manga(keyword, page_num=1):
         "platform": 1
     }
     # API地址
-    api_url = "https://" + API_ADDER + "/api/v3/search/comic"
+    api_url = API_SCHEME + "://" + API_ADDER + "/api/v3/search/comic"
     try:
-        # 发送GET请求
-        response = requests.get(api_url, headers=headers, params=params)
-        # 检查响应状态码
-        response.raise_for_status()
-        # 解析JSON响应
-        data = response.json()
+        # 发送GET请求（优先读取缓存）
+        data = api_cache.get("search", api_url, params=params)
         return data
 
     except requests.exceptions.RequestException as e:
@@ -249,28 +962,14 @@ def print_full_json(json_data):
         logger.info("没有JSON数据可打印")
 
 def get_comic(comic_path_word):
-    headers = {
-        "User-Agent": "COPY/3.0.0",
-        "Accept": "application/json",
-        "version": "2025.08.15",
-        "platform": "1",
-        "webp": "1",
-        "region": "1"
-    }
     params = {
         "platform": 1
     }
     # API地址
-    api_url = "https://" + API_ADDER + "/api/v3/comic2/" + comic_path_word
+    api_url = API_SCHEME + "://" + API_ADDER + "/api/v3/comic2/" + comic_path_word
     try:
-        # 发送GET请求
-        response = requests.get(api_url, headers=headers,params=params)
-
-        # 检查响应状态码
-        response.raise_for_status()
-
-        # 解析JSON响应
-        data = response.json()
+        # 发送GET请求（优先读取缓存）
+        data = api_cache.get("comic2", api_url, params=params)
 
         return data
 
@@ -298,31 +997,17 @@ def print_comic_results(results):
     new_chapter = comic.get("last_chapter", {})
     logger.info(f"   最新章节: {new_chapter.get('name', '未知章节')}")
 
-def get_chapters(comic_path_word,page_num=1):
-    headers = {
-        "User-Agent": "COPY/3.0.0",
-        "Accept": "application/json",
-        "version": "2025.08.15",
-        "platform": "1",
-        "webp": "1",
-        "region": "1"
-    }
-    limit = 50 #每次获取n个
+def get_chapters(comic_path_word,page_num=1,refresh=False):
+    limit = CHAPTER_PAGE_LIMIT #每次获取n个
     offset = (page_num - 1) * limit #偏移量
     params = {
         "limit": limit,
         "offset": offset,
     }
-    api_url = "https://" + API_ADDER + "/api/v3/comic/" + comic_path_word + "/group/default/chapters"
+    api_url = API_SCHEME + "://" + API_ADDER + "/api/v3/comic/" + comic_path_word + "/group/default/chapters"
     try:
-        # 发送GET请求
-        response = requests.get(api_url, headers=headers,params=params)
-
-        # 检查响应状态码
-        response.raise_for_status()
-
-        # 解析JSON响应
-        data = response.json()
+        # 发送GET请求（优先读取缓存）
+        data = api_cache.get("chapters", api_url, params=params, refresh=refresh)
 
         return data
 
@@ -353,24 +1038,10 @@ def print_chapters_results(results):
 
 
 def get_comic_image(comic_path_word,uuid):
-    headers = {
-        "User-Agent": "COPY/3.0.0",
-        "Accept": "application/json",
-        "version": "2025.08.15",
-        "platform": "1",
-        "webp": "1",
-        "region": "1"
-    }
-    api_url = "https://" + API_ADDER + "/api/v3/comic/" + comic_path_word + "/chapter2/" + uuid
+    api_url = API_SCHEME + "://" + API_ADDER + "/api/v3/comic/" + comic_path_word + "/chapter2/" + uuid
     try:
-        # 发送GET请求
-        response = requests.get(api_url, headers=headers)
-
-        # 检查响应状态码
-        response.raise_for_status()
-
-        # 解析JSON响应
-        data = response.json()
+        # 发送GET请求（优先读取缓存）
+        data = api_cache.get("chapter2", api_url)
 
         return data
 
@@ -381,16 +1052,168 @@ def get_comic_image(comic_path_word,uuid):
         logger.warning(f"JSON解析错误: {e}")
         return None
 
-def images_to_pdf(image_dir, output_pdf, number, password=None):
-
-
-    c = canvas.Canvas(output_pdf, pagesize=letter)  # 创建 PDF 画布
-    width, height = letter  # 获取页面尺寸
-    if password:
+def read_jpeg_info(data):
+    """
+    只解析JPEG文件头获取图片信息（不解码图片）
+    :return: (宽, 高, 颜色通道数, 是否为Adobe格式)，解析失败返回None
+    """
+    pos = 2
+    adobe = False
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        if marker == 0xEE and data[pos + 4:pos + 9] == b"Adobe":
+            adobe = True
+        if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            height = int.from_bytes(data[pos + 5:pos + 7], "big")
+            width = int.from_bytes(data[pos + 7:pos + 9], "big")
+            components = data[pos + 9]
+            return width, height, components, adobe
+        pos += 2 + length
+    return None
+
+class DirectPdfWriter:
+    """
+    直接写入PDF文件，JPEG图片原样嵌入(DCTDecode)不重新压缩
+    - 图片尺寸只从文件头读取
+    - 只有WebP/PNG等非JPEG图片才转换为JPEG
+    - 每页写入后立即释放，内存中只保留一张图片
+    - 支持与reportlab相同的标准加密(RC4)
+    """
+    PAGE_SIZE = (612.0, 792.0)  # letter
+
+    def __init__(self, output_pdf, password=None):
+        self.output_pdf = output_pdf
+        self._tmp_path = output_pdf + ".part"
+        self._file = open(self._tmp_path, "wb")
+        self._offsets = {}
+        self._page_ids = []
+        self._next_id = 3  # 1为Catalog，2为Pages
+        self._file_id = os.urandom(16)
+        self._key = None
+        self._encrypt_id = None
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        if password:
+            self._setup_encryption(str(password))
+
+    def _write(self, data):
+        self._file.write(data)
+
+    def _alloc(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _setup_encryption(self, password):
+        from reportlab.lib import pdfencrypt
+        revision = pdfencrypt.checkRevision(None)
+        if revision not in (2, 3):
+            revision = 3
+        self._revision = revision
+        permissions = int(pdfencrypt.StandardEncryption(password).permissionBits() - 2 ** 31)
+        owner_key = pdfencrypt.computeO(password, password, revision)
+        self._key = pdfencrypt.encryptionkey(password, owner_key, permissions, self._file_id, revision)
+        user_key = pdfencrypt.computeU(self._key, revision=revision, documentId=self._file_id)
+        self._encrypt_id = self._alloc()
+        if revision == 3:
+            version = b"/V 2 /R 3 /Length 128"
+        else:
+            version = b"/V 1 /R 2"
+        self._write_object(self._encrypt_id, b"<< /Filter /Standard " + version +
+                           b" /O <" + owner_key.hex().encode() + b"> /U <" + user_key.hex().encode() +
+                           b"> /P " + str(permissions).encode() + b" >>")
+
+    def _write_object(self, obj_id, body, stream=None):
+        self._offsets[obj_id] = self._file.tell()
+        self._write(f"{obj_id} 0 obj\n".encode())
+        if stream is not None:
+            if self._key is not None:
+                from reportlab.lib.pdfencrypt import encodePDF
+                stream = encodePDF(self._key, obj_id, 0, stream, revision=self._revision)
+            self._write(body[:-2] + f" /Length {len(stream)} >>\nstream\n".encode())
+            self._write(stream)
+            self._write(b"\nendstream")
+        else:
+            self._write(body)
+        self._write(b"\nendobj\n")
+
+    def add_jpeg_page(self, data, info):
+        """添加一页JPEG图片（原样嵌入）"""
+        img_width, img_height, components, adobe = info
+        color_space = {1: b"/DeviceGray", 3: b"/DeviceRGB", 4: b"/DeviceCMYK"}.get(components)
+        if color_space is None:
+            raise ValueError(f"不支持的JPEG颜色通道数: {components}")
+        decode = b" /Decode [1 0 1 0 1 0 1 0]" if components == 4 and adobe else b""
+        image_id = self._alloc()
+        self._write_object(image_id, b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s"
+                           b" /BitsPerComponent 8 /Filter /DCTDecode%s >>" % (img_width, img_height, color_space, decode),
+                           data)
+
+        # 按比例缩放图片以适应页面
+        width, height = self.PAGE_SIZE
+        scale = min(width / img_width, height / img_height)
+        new_width = img_width * scale
+        new_height = img_height * scale
+        x = (width - new_width) / 2
+        y = (height - new_height) / 2
+        content_id = self._alloc()
+        self._write_object(content_id, b"<< >>",
+                           f"q {new_width:.4f} 0 0 {new_height:.4f} {x:.4f} {y:.4f} cm /Im0 Do Q".encode())
+
+        page_id = self._alloc()
+        self._write_object(page_id, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d]"
+                           b" /Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+                           % (width, height, image_id, content_id))
+        self._page_ids.append(page_id)
+
+    def add_image_page(self, image_path):
+        """添加一页图片：JPEG直接嵌入，其他格式转换为JPEG"""
+        with open(image_path, "rb") as f:
+            data = f.read()
+        info = read_jpeg_info(data) if detect_image_format(data[:IMAGE_HEAD_SIZE]) == "jpeg" else None
+        if info is None:
+            from PIL import Image
+            with Image.open(io.BytesIO(data)) as img:
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                buffer = io.BytesIO()
+                img.save(buffer, "JPEG", quality=90)
+            data = buffer.getvalue()
+            info = read_jpeg_info(data)
+        self.add_jpeg_page(data, info)
+
+    def close(self):
+        self._write_object(2, b"<< /Type /Pages /Kids [" +
+                           b" ".join(b"%d 0 R" % page_id for page_id in self._page_ids) +
+                           b"] /Count %d >>" % len(self._page_ids))
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref_offset = self._file.tell()
+        size = self._next_id
+        self._write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for obj_id in range(1, size):
+            self._write(f"{self._offsets[obj_id]:010d} 00000 n \n".encode())
+        file_id = self._file_id.hex().encode()
+        trailer = b"<< /Size %d /Root 1 0 R /ID [<%s> <%s>]" % (size, file_id, file_id)
+        if self._encrypt_id is not None:
+            trailer += b" /Encrypt %d 0 R" % self._encrypt_id
+        self._write(b"trailer\n" + trailer + b" >>\nstartxref\n%d\n%%%%EOF\n" % xref_offset)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.output_pdf)
 
-        c.setEncrypt(password)
+def images_to_pdf(image_dir, output_pdf, number, password=None):
+    writer = DirectPdfWriter(output_pdf, password)
 
-    for i in range(1, number):
+    for i in range(1, number + 1):
         image_name = f"{i:03d}.jpg"  # 生成图片文件名，如 001.jpg, 002.jpg ...
         image_path = os.path.join(image_dir, image_name)
 
@@ -399,29 +1222,19 @@ def images_to_pdf(image_dir, output_pdf, number, password=None):
             continue
 
         try:
-            img = Image.open(image_path)
-            img_width, img_height = img.size
-
-            # 按比例缩放图片以适应页面
-            scale_x = width / img_width
-            scale_y = height / img_height
-            scale = min(scale_x, scale_y)
-            new_width = img_width * scale
-            new_height = img_height * scale
-
-            x = (width - new_width) / 2
-            y = (height - new_height) / 2
-
-            c.drawImage(image_path, x, y, width=new_width, height=new_height)
-            c.showPage() # 添加新页面
-            logger.info(f"恭喜:图片 {image_name} 添加成功。")
+            writer.add_image_page(image_path)
+            logger.debug(f"恭喜:图片 {image_name} 添加成功。")
         except Exception as e:
             logger.warning(f"错误: 处理图片 {image_path} 时出错: {e}")
 
-    c.save()
+    writer.close()
     logger.info(f"PDF 文件已生成: {output_pdf}")
 
 def make_pdf(path, number, password=None):
+    """
+    将章节图片目录转换为PDF（可在进程池中执行）
+    :return: 生成的PDF路径，失败返回None
+    """
 
     # 确保传入的路径是绝对路径
     if not os.path.isabs(path):
@@ -444,12 +1257,12 @@ def make_pdf(path, number, password=None):
     # 确保图片目录存在
     if not os.path.exists(path):
         logger.warning(f"错误: 目录 {path} 不存在.")
-        return
+        return None
 
     # 确保上一级目录存在（用于保存PDF）
     if not os.path.exists(parent_dir):
         logger.warning(f"错误: 上一级目录 {parent_dir} 不存在.")
-        return
+        return None
 
     # 检查目录中是否有图片文件
     image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp']
@@ -464,111 +1277,1363 @@ def make_pdf(path, number, password=None):
 
     if not image_files:
         logger.warning(f"警告: 目录 {path} 中没有找到图片文件")
-        return
+        return None
 
     logger.info(f"找到 {len(image_files)} 张图片")
 
     # 调用图片转PDF函数
     images_to_pdf(path, output_pdf_file, number, password)
+    return output_pdf_file
 
-def handle_chapters_results(results,start_num,end_num,path):
-    if not results:
-        logger.warning("没有获取到结果")
-        return 0
-    if results.get("code") != 200:
-        logger.warning(f"搜索失败: {results.get('message', '未知错误')}")
-        return 0
-    results_data = results.get("results", {})
-    comic_list = results_data.get("list", [])
-    offset = results_data.get("offset", 0)
-    headers = {
-        "User-Agent": "COPY/3.0.0",
-        "Accept": "application/json",
-        "version": "2025.08.15",
-        "platform": "1",
-        "webp": "1",
-        "region": "1"
+IMAGE_MEDIA_TYPES = {
+    "jpeg": ("jpg", "image/jpeg"),
+    "png": ("png", "image/png"),
+    "webp": ("webp", "image/webp"),
+    "gif": ("gif", "image/gif"),
+}
+
+def list_chapter_pages(image_dir, number):
+    """
+    按页码顺序列出章节图片及其真实格式
+    :return: [(图片路径, 格式)]
+    """
+    pages = []
+    for i in range(1, number + 1):
+        image_path = os.path.join(image_dir, f"{i:03d}.jpg")
+        if not os.path.exists(image_path):
+            logger.warning(f"警告: 图片 {image_path} 不存在，跳过.")
+            continue
+        with open(image_path, "rb") as f:
+            image_format = detect_image_format(f.read(IMAGE_HEAD_SIZE)) or "jpeg"
+        pages.append((image_path, image_format))
+    return pages
+
+def chapter_output_path(path, ext):
+    """章节输出文件路径：图片目录的上一级目录中，与章节目录同名"""
+    path = os.path.abspath(path).rstrip('/\\')
+    return os.path.join(os.path.dirname(path), f"{os.path.basename(path)}.{ext}")
+
+def finish_output_file(tmp_path, output_file):
+    """输出文件落盘后原子重命名"""
+    with open(tmp_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, output_file)
+
+def make_cbz(path, number):
+    """
+    将章节图片目录打包为CBZ（图片原样存储，不压缩不转换）
+    :return: 生成的CBZ路径，失败返回None
+    """
+    pages = list_chapter_pages(path, number)
+    if not pages:
+        logger.warning(f"警告: 目录 {path} 中没有找到图片文件")
+        return None
+    output_file = chapter_output_path(path, "cbz")
+    tmp_path = output_file + ".part"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_STORED) as zf:
+        for i, (image_path, image_format) in enumerate(pages, start=1):
+            zf.write(image_path, f"{i:03d}.{IMAGE_MEDIA_TYPES[image_format][0]}")
+    finish_output_file(tmp_path, output_file)
+    logger.info(f"CBZ 文件已生成: {output_file}")
+    return output_file
+
+def read_image_size(image_path, image_format):
+    """只读取文件头获取图片尺寸"""
+    if image_format == "jpeg":
+        with open(image_path, "rb") as f:
+            info = read_jpeg_info(f.read(256 * 1024))
+        if info is not None:
+            return info[0], info[1]
+    from PIL import Image
+    with Image.open(image_path) as img:
+        return img.size
+
+def make_epub(path, number):
+    """
+    将章节图片目录打包为固定版式EPUB3（每页一张图片，图片原样存储）
+    :return: 生成的EPUB路径，失败返回None
+    """
+    pages = list_chapter_pages(path, number)
+    if not pages:
+        logger.warning(f"警告: 目录 {path} 中没有找到图片文件")
+        return None
+    output_file = chapter_output_path(path, "epub")
+    abs_path = os.path.abspath(path).rstrip('/\\')
+    chapter_name = html.escape(os.path.basename(abs_path))
+    comic_name = html.escape(os.path.basename(os.path.dirname(abs_path)))
+    title = f"{comic_name} {chapter_name}"
+    book_id = uuid.uuid5(uuid.NAMESPACE_URL, abs_path)
+    modified = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    manifest_items = []
+    spine_items = []
+    tmp_path = output_file + ".part"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        # mimetype必须是第一个且不压缩
+        zf.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        zf.writestr("META-INF/container.xml",
+                    '<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                    '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+                    '</rootfiles></container>')
+        for i, (image_path, image_format) in enumerate(pages, start=1):
+            ext, media_type = IMAGE_MEDIA_TYPES[image_format]
+            width, height = read_image_size(image_path, image_format)
+            zf.write(image_path, f"OEBPS/images/{i:03d}.{ext}", compress_type=zipfile.ZIP_STORED)
+            zf.writestr(f"OEBPS/page{i:03d}.xhtml",
+                        '<?xml version="1.0" encoding="UTF-8"?>\n'
+                        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+                        f'<head><title>{title} {i}</title>'
+                        f'<meta name="viewport" content="width={width}, height={height}"/>'
+                        '<style>html,body{margin:0;padding:0}img{display:block;width:100%;height:100%}</style></head>'
+                        f'<body><img src="images/{i:03d}.{ext}" alt="{i}"/></body></html>')
+            manifest_items.append(f'<item id="img{i:03d}" href="images/{i:03d}.{ext}" media-type="{media_type}"/>')
+            manifest_items.append(f'<item id="page{i:03d}" href="page{i:03d}.xhtml" media-type="application/xhtml+xml"/>')
+            spine_items.append(f'<itemref idref="page{i:03d}"/>')
+        zf.writestr("OEBPS/nav.xhtml",
+                    '<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+                    f'<head><title>{title}</title></head><body><nav epub:type="toc"><ol>'
+                    f'<li><a href="page001.xhtml">{chapter_name}</a></li></ol></nav></body></html>')
+        zf.writestr("OEBPS/content.opf",
+                    '<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="bookid">'
+                    '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+                    f'<dc:identifier id="bookid">urn:uuid:{book_id}</dc:identifier>'
+                    f'<dc:title>{title}</dc:title><dc:language>zh</dc:language>'
+                    f'<meta property="dcterms:modified">{modified}</meta>'
+                    '<meta property="rendition:layout">pre-paginated</meta>'
+                    '<meta property="rendition:spread">none</meta></metadata>'
+                    '<manifest><item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>'
+                    + "".join(manifest_items) +
+                    '</manifest><spine>' + "".join(spine_items) + '</spine></package>')
+    finish_output_file(tmp_path, output_file)
+    logger.info(f"EPUB 文件已生成: {output_file}")
+    return output_file
+
+# 电子阅读器转码默认参数（常见6寸/7寸阅读器分辨率）
+TRANSCODE_DEFAULTS = {
+    "max_width": 1072,
+    "max_height": 1448,
+    "grayscale": False,
+    "format": "jpeg",  # jpeg/webp
+    "quality": 80,
+}
+
+def transcode_profile(comic_config=None):
+    """获取转码参数：漫画配置优先，其次全局配置，未配置返回None"""
+    profile = (comic_config or {}).get("transcode", transcode)
+    if not profile:
+        return None
+    if profile is True:
+        profile = {}
+    return {**TRANSCODE_DEFAULTS, **profile}
+
+def transcode_size(width, height, max_width, max_height):
+    """
+    计算转码后的图片尺寸：普通页面完整缩放到屏幕内；
+    条漫等超长图片完整缩放后宽度不足屏幕一半时只按屏幕宽度缩放，高度按比例，避免缩成一条细线
+    """
+    scale = min(max_width / width, max_height / height, 1)
+    if width * scale < max_width / 2:
+        scale = min(max_width / width, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def transcode_page(image_path, profile):
+    """
+    按转码参数缩放/灰度化/重新压缩单张图片（在进程池中执行）
+    JPEG使用draft()在解码时直接缩小，其他格式使用reduce()整数倍快速缩小
+    :return: (转码前字节数, 转码后字节数, sha256)
+    """
+    mode = "L" if profile["grayscale"] else "RGB"
+    from PIL import Image
+    with open(image_path, "rb") as f:
+        original = f.read()
+    with Image.open(io.BytesIO(original)) as img:
+        target = transcode_size(img.width, img.height, profile["max_width"], profile["max_height"])
+        if img.format == "JPEG":
+            img.draft(mode, target)
+        factor = int(min(img.width / target[0], img.height / target[1]))
+        if factor >= 2:
+            img = img.reduce(factor)
+        if img.width > target[0] or img.height > target[1]:
+            img = img.resize(target, Image.LANCZOS)
+        if img.mode != mode:
+            img = img.convert(mode)
+        buffer = io.BytesIO()
+        img.save(buffer, "WEBP" if profile["format"] == "webp" else "JPEG", quality=profile["quality"])
+    data = buffer.getvalue()
+    # 转码后反而更大时保留原图
+    if len(data) >= len(original):
+        data = original
+    else:
+        atomic_write(image_path, data)
+    return len(original), len(data), hashlib.sha256(data).hexdigest()
+
+transcode_before_bytes = ByteCounter()
+transcode_after_bytes = ByteCounter()
+
+def transcode_chapter(meta, profile):
+    """
+    将章节图片按页提交到进程池并行转码，并更新下载清单（重新运行时跳过已转码的图片）
+    :return: 是否全部转码成功
+    """
+    output_dir = meta["output_dir"]
+    manifest = ChapterManifest(output_dir)
+    signature = json.dumps(profile, sort_keys=True)
+    executor = get_output_executor()
+    futures = {}
+    for i in range(1, len(meta["contents"]) + 1):
+        filename = f"{i:03d}.jpg"
+        entry = manifest.pages.get(filename)
+        if entry is None or entry.get("transcode") == signature:
+            continue
+        futures[executor.submit(transcode_page, os.path.join(output_dir, filename), profile)] = filename
+
+    before_total = after_total = 0
+    success = True
+    for future in as_completed(futures):
+        filename = futures[future]
+        try:
+            before, after, sha256 = future.result()
+        except Exception as e:
+            logger.warning(f"图片 {filename} 转码失败: {e}")
+            success = False
+            continue
+        manifest.record(filename, manifest.pages[filename]["url"], after, sha256, transcode=signature)
+        before_total += before
+        after_total += after
+    manifest.save()
+    if futures:
+        transcode_before_bytes.add(before_total)
+        transcode_after_bytes.add(after_total)
+        logger.info(f"转码完成: {meta['chapter_name']} 共 {len(futures)} 页，"
+                    f"{before_total / 1024 / 1024:.2f} MB -> {after_total / 1024 / 1024:.2f} MB")
+    return success
+
+# 输出格式 -> 转换函数（均为顶层函数，可提交到进程池）
+OUTPUT_WRITERS = {
+    "pdf": make_pdf,
+    "cbz": make_cbz,
+    "epub": make_epub,
+}
+
+def default_output_format():
+    """全局输出格式：未配置output_format时由pdf_switch决定"""
+    if output_format:
+        return output_format
+    return "pdf" if pdf_switch == 1 else "none"
+
+class ChapterIndex:
+    """
+    本地章节索引(SQLite)：保存每部漫画 章节序号 -> uuid/名称/大小/创建时间
+    首次完整拉取后，只增量请求本地最后一章所在页及之后的章节列表页
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS chapters (
+                    path TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    uuid TEXT NOT NULL,
+                    name TEXT,
+                    size INTEGER,
+                    datetime_created TEXT,
+                    PRIMARY KEY (path, idx)
+                );
+                CREATE TABLE IF NOT EXISTS comics (
+                    path TEXT PRIMARY KEY,
+                    total INTEGER NOT NULL,
+                    synced_at TEXT
+                );
+                CREATE TABLE IF NOT EXISTS updates (
+                    path TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fingerprint TEXT NOT NULL,
+                    total INTEGER NOT NULL
+                );
+            """)
+        return self._conn
+
+    def known_count(self, path):
+        """本地已保存的章节数"""
+        with self._lock:
+            row = self._connect().execute("SELECT COUNT(*) FROM chapters WHERE path = ?", (path,)).fetchone()
+            return row[0]
+
+    def get_range(self, path, start_num, end_num):
+        """
+        从本地索引读取章节
+        :return: 按顺序排列的[(章节序号, 章节信息)]
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT idx, uuid, name, size, datetime_created FROM chapters "
+                "WHERE path = ? AND idx BETWEEN ? AND ? ORDER BY idx",
+                (path, start_num, end_num)).fetchall()
+        return [(idx, {"uuid": uuid, "name": name, "size": size, "datetime_created": created})
+                for idx, uuid, name, size, created in rows]
+
+    def _store(self, path, offset, chapter_list):
+        """保存一页章节，若与已保存章节的uuid不一致则返回False"""
+        with self._lock:
+            conn = self._connect()
+            for index, chapter in enumerate(chapter_list, start=offset + 1):
+                row = conn.execute("SELECT uuid FROM chapters WHERE path = ? AND idx = ?", (path, index)).fetchone()
+                if row and row[0] != chapter.get("uuid"):
+                    return False
+            conn.executemany(
+                "INSERT OR REPLACE INTO chapters (path, idx, uuid, name, size, datetime_created) VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, index, chapter.get("uuid"), chapter.get("name"), chapter.get("size"), chapter.get("datetime_created"))
+                 for index, chapter in enumerate(chapter_list, start=offset + 1)])
+            conn.commit()
+            return True
+
+    def _save_total(self, path, total):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO comics (path, total, synced_at) VALUES (?, ?, ?)",
+                         (path, total, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            conn.commit()
+
+    def get_marker(self, path):
+        """
+        读取上次检查更新时comic2接口的变化标记
+        :return: {"etag", "last_modified", "fingerprint", "total"}，没有记录返回None
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT etag, last_modified, fingerprint, total FROM updates WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "fingerprint": row[2], "total": row[3]}
+
+    def save_marker(self, path, etag, last_modified, fingerprint, total):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO updates (path, etag, last_modified, fingerprint, total) VALUES (?, ?, ?, ?, ?)",
+                         (path, etag, last_modified, fingerprint, total))
+            conn.commit()
+
+    def clear(self, path):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM chapters WHERE path = ?", (path,))
+            conn.execute("DELETE FROM comics WHERE path = ?", (path,))
+            conn.execute("DELETE FROM updates WHERE path = ?", (path,))
+            conn.commit()
+
+    def sync(self, path):
+        """
+        增量同步章节列表
+        :return: 最新章节总数(获取失败返回0)
+        """
+        known = self.known_count(path)
+        # 从本地最后一章所在页开始请求，用重叠部分校验本地索引是否仍然有效
+        page = max(known - 1, 0) // CHAPTER_PAGE_LIMIT + 1
+        total = None
+        requested = 0
+        while total is None or (page - 1) * CHAPTER_PAGE_LIMIT < total:
+            results = get_chapters(path, page, refresh=True)
+            requested += 1
+            if not results:
+                logger.warning(f"第{page}页章节列表没有获取到结果")
+                return 0 if total is None else total
+            if results.get("code") != 200:
+                logger.warning(f"第{page}页章节列表获取失败: {results.get('message', '未知错误')}")
+                return 0 if total is None else total
+            results_data = results.get("results", {})
+            total = results_data.get("total", 0)
+            if not self._store(path, results_data.get("offset", 0), results_data.get("list", [])):
+                logger.warning(f"【{path}】章节列表已变化，重建本地章节索引")
+                self.clear(path)
+                return self.sync(path)
+            page += 1
+        self._save_total(path, total)
+        logger.info(f"【{path}】章节索引同步完成: 本地已有 {known} 章，最新 {total} 章，请求 {requested} 页")
+        return total
+
+chapter_index = ChapterIndex(CHAPTER_INDEX_PATH)
+
+def fetch_chapters_from_api(path, start_num, end_num):
+    """
+    从接口获取指定范围内的章节列表（每个章节列表页只请求一次）
+    :param path: 漫画路径
+    :param start_num: 起始章节
+    :param end_num: 结束章节
+    :return: 按顺序排列的[(章节序号, 章节信息)]
+    """
+    chapters = []
+    first_page = (start_num - 1) // CHAPTER_PAGE_LIMIT + 1
+    last_page = (end_num - 1) // CHAPTER_PAGE_LIMIT + 1
+    for page in range(first_page, last_page + 1):
+        results = get_chapters(path, page)
+        if not results:
+            logger.warning(f"第{page}页章节列表没有获取到结果")
+            break
+        if results.get("code") != 200:
+            logger.warning(f"第{page}页章节列表获取失败: {results.get('message', '未知错误')}")
+            break
+        results_data = results.get("results", {})
+        offset = results_data.get("offset", 0)
+        for index, chapter in enumerate(results_data.get("list", []), start=offset + 1):
+            if start_num <= index <= end_num:
+                chapters.append((index, chapter))
+    return chapters
+
+def collect_chapters(path, start_num, end_num):
+    """
+    获取指定范围内的章节列表，优先读取本地章节索引，缺失时增量同步
+    :return: 按顺序排列的[(章节序号, 章节信息)]
+    """
+    if chapter_index_switch != 1:
+        return fetch_chapters_from_api(path, start_num, end_num)
+    chapters = chapter_index.get_range(path, start_num, end_num)
+    if len(chapters) < end_num - start_num + 1:
+        chapter_index.sync(path)
+        chapters = chapter_index.get_range(path, start_num, end_num)
+    return chapters
+
+def fetch_chapter_meta(path, index, chapter_info):
+    """
+    获取章节图片信息并创建输出目录
+    :param path: 漫画路径
+    :param index: 章节序号
+    :param chapter_info: 章节列表中的章节信息
+    :return: 章节信息字典，获取失败返回None
+    """
+    logger.info(f"正在获取第{index}章: {chapter_info.get('name', '未知章节')}    UUID:{chapter_info.get('uuid', '')}")
+    data = get_comic_image(path, chapter_info.get("uuid"))
+    if not data or data.get("code") != 200:
+        logger.warning(f"第{index}章图片信息获取失败")
+        return None
+    chapter = data["results"]["chapter"]
+    comic_name = data["results"]["comic"]["name"]
+    chapter_name = chapter["name"]
+    output_dir = "./out/" + comic_name +"/" + chapter_name
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        logger.info(f"创建目录: {output_dir}")
+    return {
+        "index": index,
+        "comic_name": comic_name,
+        "chapter_name": chapter_name,
+        "output_dir": output_dir,
+        "contents": [dict(item, url=rewrite_image_url(item["url"])) for item in chapter["contents"]],  # 所有图片信息
+        "words": chapter["words"],
     }
-    for index, comic in enumerate(comic_list, start=offset + 1):
-        if start_num <= index <= end_num:
-            logger.info(f"正在下载第{index}章: {comic.get('name', '未知章节')}    UUID:{comic.get('uuid', '')}")
-            data =  get_comic_image(path, comic.get("uuid"))
-            chapter = data["results"]["chapter"]
-            comic_name = data["results"]["comic"]["name"]
-            chapter_name = chapter["name"]
-            output_dir = "./out/" + comic_name +"/" + chapter_name
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-                logger.info(f"创建目录: {output_dir}")
-            contents = chapter["contents"]  # 所有图片信息
-            words = chapter["words"]
-            logger.info(f"开始下载: {comic_name} - {chapter_name}")
-            logger.info(f"总页数: {len(contents)}")
-            
-            # 使用多线程下载图片
-            success_count = download_images_multithreaded(contents, words, output_dir, headers)
-            
-            logger.info("下载完成!")
-            logger.info(f"成功下载: {success_count}/{len(contents)} 页")
-            if success_count < len(contents):
-                return 0
-            if pdf_switch == 1:
-                if pdf_password is None:
-                    make_pdf(output_dir,len(contents))
-                else:
-                    make_pdf(output_dir,len(contents),pdf_password)
-            # 添加5-10秒随机延时
-            import random
-            delay = random.uniform(5, 10)
-            logger.info(f"章节下载完成，等待 {delay:.1f} 秒后继续...")
-            time.sleep(delay)
-            return 1
 
-def download_images_multithreaded(contents, words, output_dir, headers, max_workers=5):
+def rewrite_image_url(url):
+    """设置了IMAGE_HOST时将图片URL的协议和域名替换为IMAGE_HOST"""
+    if not IMAGE_HOST:
+        return url
+    parts = urlsplit(url)
+    host = urlsplit(IMAGE_HOST)
+    return parts._replace(scheme=host.scheme, netloc=host.netloc).geturl()
+
+class ChapterDownload(Future):
+    """章节下载的Future，结果为是否全部下载成功；可取消尚未开始下载的图片"""
+
+    def __init__(self):
+        super().__init__()
+        self.images = None #submit_chapter_images返回的Future
+
+    def cancel_pending(self):
+        """取消尚未开始下载的图片（正在下载的图片完成后结束，章节记为失败）"""
+        if self.images is not None:
+            cancel_chapter_images(self.images)
+
+def start_chapter_download(meta):
+    """
+    开始下载章节的所有图片（不等待下载完成）
+    :param meta: fetch_chapter_meta返回的章节信息
+    :return: ChapterDownload，结果为是否全部下载成功
     """
-    使用多线程下载图片
+    contents = meta["contents"]
+    logger.info(f"开始下载: {meta['comic_name']} - {meta['chapter_name']}，共 {len(contents)} 页")
+    download_progress.start(meta["output_dir"], len(contents))
+    result = ChapterDownload()
+
+    def finish(future):
+        elapsed = download_progress.finish(meta["output_dir"])
+        try:
+            success_count = future.result()
+        except CancelledError:
+            logger.info(f"{meta['chapter_name']} 下载已取消")
+            result.set_result(False)
+            return
+        except Exception as e:
+            logger.warning(f"{meta['chapter_name']} 下载时发生异常: {e}")
+            result.set_result(False)
+            return
+        logger.info(f"下载完成: {meta['chapter_name']}，成功 {success_count}/{len(contents)} 页，用时 {elapsed:.1f} 秒")
+        result.set_result(success_count == len(contents))
+
+    result.images = submit_chapter_images(contents, meta["words"], meta["output_dir"])
+    result.images.add_done_callback(finish)
+    return result
+
+def download_chapter_pages(meta):
+    """
+    下载章节的所有图片
+    :param meta: fetch_chapter_meta返回的章节信息
+    :return: 是否全部下载成功
+    """
+    return start_chapter_download(meta).result()
+
+def get_output_executor():
+    """获取输出转换进程池（按CPU核数创建）"""
+    global output_executor
+    if output_executor is None:
+        workers = output_workers or os.cpu_count() or 1
+        from concurrent.futures import ProcessPoolExecutor
+        output_executor = ProcessPoolExecutor(max_workers=workers, initializer=init_output_process)
+        logger.info(f"输出转换进程池已启动，进程数: {workers}")
+    return output_executor
+
+def shutdown_output_executor():
+    """等待所有输出转换完成并关闭进程池"""
+    global output_executor
+    if output_executor is not None:
+        output_executor.shutdown(wait=True)
+        output_executor = None
+
+def timed_call(func, *args):
+    """在进程池中执行func并返回(结果, 耗时秒数)"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def build_chapter_output(meta, comic_config=None):
+    """
+    按设置生成章节输出文件（转码和输出转换均在进程池中执行）
+    :param comic_config: 漫画配置(output_format/transcode)，None为全局设置
+    :return: Future，结果为已写入磁盘的输出路径（不生成文件时为图片目录），失败为None
+    """
+    profile = transcode_profile(comic_config)
+    if profile:
+        with metrics.span("transcode"):
+            transcode_chapter(meta, profile)
+    chapter_format = (comic_config or {}).get("output_format") or default_output_format()
+    if chapter_format == "none":
+        future = Future()
+        future.set_result(meta["output_dir"])
+        return future
+    writer = OUTPUT_WRITERS.get(chapter_format)
+    if writer is None:
+        future = Future()
+        future.set_exception(ValueError(f"不支持的输出格式: {chapter_format}"))
+        return future
+    if chapter_format == "pdf" and pdf_password is not None:
+        inner = get_output_executor().submit(timed_call, make_pdf, meta["output_dir"], len(meta["contents"]), pdf_password)
+    else:
+        inner = get_output_executor().submit(timed_call, writer, meta["output_dir"], len(meta["contents"]))
+    future = Future()
+
+    def finish(done):
+        # 耗时在工作进程中统计，此处记录到本进程的运行统计
+        try:
+            output_path, seconds = done.result()
+        except Exception as e:
+            future.set_exception(e)
+            return
+        metrics.observe(f"output.{chapter_format}", seconds)
+        future.set_result(output_path)
+
+    inner.add_done_callback(finish)
+    return future
+
+def wait_chapter_output(index, future):
+    """等待章节输出转换完成，成功的输出按提交顺序记录到run_outputs，返回是否成功"""
+    try:
+        output_path = future.result()
+    except Exception as e:
+        logger.warning(f"第{index}章输出转换失败: {e}")
+        return False
+    if not output_path:
+        return False
+    run_outputs.append(output_path)
+    return True
+
+def download_chapter(path, index, chapter_info, comic_config=None):
+    """
+    下载单个章节（图片下载完成后按设置生成PDF）
+    :param path: 漫画路径
+    :param index: 章节序号
+    :param chapter_info: 章节列表中的章节信息
+    :return: 是否下载成功
+    """
+    meta = fetch_chapter_meta(path, index, chapter_info)
+    if meta is None or not download_chapter_pages(meta):
+        return False
+    return wait_chapter_output(index, build_chapter_output(meta, comic_config))
+
+def run_chapter_pipeline(chapters, path, stop_on_failure=False, on_success=None, comic_config=None):
+    """
+    流水线下载章节：图片信息获取 -> 图片下载 -> PDF生成 -> 按章节顺序提交
+    每个阶段一个线程，阶段之间使用有界队列连接：
+    下载阶段只提交章节到全局下载调度器，多个章节的图片同时下载(优先完成靠前的章节)，
+    同时在进程池中生成之前章节的PDF，并预取后续章节的图片信息
+    章节输出写入磁盘后才按顺序提交
+    :return: 每个章节的下载结果[(章节序号, 是否成功)]
+    """
+    stop = threading.Event()
+    meta_queue = queue.Queue(maxsize=pipeline_queue_size)
+    output_queue = queue.Queue(maxsize=pipeline_queue_size)
+    # 进程池中可同时转换多个章节
+    done_queue = queue.Queue(maxsize=max(pipeline_queue_size, output_workers or os.cpu_count() or 1))
+
+    def put(q, item):
+        # 下游终止后不再阻塞在已满的队列上
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while True:
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                if stop.is_set():
+                    return None
+
+    # 各阶段中单个章节出错时记为失败并继续处理后续章节，阶段结束时总是发送结束标记，避免下游一直等待
+    def meta_stage():
+        try:
+            for index, chapter_info in chapters:
+                try:
+                    meta = fetch_chapter_meta(path, index, chapter_info)
+                except Exception as e:
+                    logger.warning(f"第{index}章获取图片信息时发生异常: {e}")
+                    meta = None
+                if not put(meta_queue, (index, meta)):
+                    return
+        finally:
+            put(meta_queue, None)
+
+    def download_stage():
+        try:
+            while (item := get(meta_queue)) is not None:
+                index, meta = item
+                try:
+                    download = start_chapter_download(meta) if meta is not None else None
+                except Exception as e:
+                    logger.warning(f"第{index}章提交下载时发生异常: {e}")
+                    download = None
+                if not put(output_queue, (index, meta, download)):
+                    if download is not None:
+                        download.cancel_pending()
+                    return
+        finally:
+            put(output_queue, None)
+
+    def output_stage():
+        try:
+            while (item := get(output_queue)) is not None:
+                index, meta, download = item
+                if download is not None:
+                    # 等待下载时检查终止标记，终止后取消该章节剩余的图片
+                    while not stop.is_set() and not wait([download], timeout=0.5).done:
+                        pass
+                    if stop.is_set():
+                        download.cancel_pending()
+                        return
+                try:
+                    success = download is not None and download.result()
+                    future = build_chapter_output(meta, comic_config) if success else None
+                except Exception as e:
+                    logger.warning(f"第{index}章生成输出时发生异常: {e}")
+                    future = None
+                if not put(done_queue, (index, future)):
+                    return
+        finally:
+            put(done_queue, None)
+
+    threads = [threading.Thread(target=stage, name=stage.__name__, daemon=True)
+               for stage in (meta_stage, download_stage, output_stage)]
+    for thread in threads:
+        thread.start()
+
+    report = []
+    try:
+        # 各阶段均为单线程FIFO，结果按章节顺序到达
+        while (item := get(done_queue)) is not None:
+            index, future = item
+            success = future is not None and wait_chapter_output(index, future)
+            report.append((index, success))
+            if success and on_success:
+                on_success(index)
+            if not success and stop_on_failure:
+                break
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        # 提前终止时取消已提交但尚未处理的章节，避免与后续漫画争用下载线程
+        while True:
+            try:
+                item = output_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[2] is not None:
+                item[2].cancel_pending()
+    return report
+
+def handle_chapters_results(chapters, path, stop_on_failure=False, on_success=None, comic_config=None):
+    """
+    依次下载章节列表中的所有章节
+    :param chapters: collect_chapters返回的[(章节序号, 章节信息)]
+    :param path: 漫画路径
+    :param stop_on_failure: 某章节失败后是否终止后续章节
+    :param on_success: 章节下载成功后的回调，参数为章节序号
+    :param comic_config: 漫画配置(output_format/transcode)，None为全局设置
+    :return: 每个章节的下载结果[(章节序号, 是否成功)]
+    """
+    if pipeline_switch == 1 and len(chapters) > 1:
+        return run_chapter_pipeline(chapters, path, stop_on_failure, on_success, comic_config)
+    report = []
+    for index, chapter_info in chapters:
+        success = download_chapter(path, index, chapter_info, comic_config)
+        report.append((index, success))
+        if success and on_success:
+            on_success(index)
+        if not success and stop_on_failure:
+            break
+    return report
+
+def print_download_report(report):
+    """打印每个章节的下载结果"""
+    success_list = [index for index, success in report if success]
+    failed_list = [index for index, success in report if not success]
+    logger.info(f"本次共处理 {len(report)} 章，成功 {len(success_list)} 章，失败 {len(failed_list)} 章")
+    if failed_list:
+        logger.warning(f"以下章节下载失败: {failed_list}")
+
+def atomic_write(filepath, data):
+    """先写入临时文件再原子重命名，避免中断后留下不完整的文件"""
+    tmp_path = filepath + ".part"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, filepath)
+
+# 图片文件头（魔数），用于在下载过程中尽早发现错误页面，以及生成PDF时识别真实格式
+IMAGE_MAGIC_CHECKS = {
+    "jpeg": lambda head: head.startswith(b"\xff\xd8\xff"),
+    "png": lambda head: head.startswith(b"\x89PNG\r\n\x1a\n"),
+    "webp": lambda head: head.startswith(b"RIFF") and head[8:12] == b"WEBP",
+    "gif": lambda head: head.startswith((b"GIF87a", b"GIF89a")),
+}
+IMAGE_HEAD_SIZE = 12
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def detect_image_format(head):
+    """根据文件头识别图片格式，无法识别返回None"""
+    for name, check in IMAGE_MAGIC_CHECKS.items():
+        if check(head):
+            return name
+    return None
+
+downloaded_bytes = ByteCounter()
+
+class PageWriter:
+    """
+    流式写入单张图片：边下载边写入临时文件，同时计算sha256
+    并在下载过程中校验图片文件头，完成后校验Content-Length再原子重命名
+    """
+
+    def __init__(self, filepath, expected_length=None, suffix=".part"):
+        self.filepath = filepath
+        self.expected_length = expected_length
+        self.size = 0
+        self._head = b""
+        self._sha256 = hashlib.sha256()
+        self._tmp_path = filepath + suffix
+        self._file = open(self._tmp_path, 'wb')
+
+    def write(self, chunk):
+        if len(self._head) < IMAGE_HEAD_SIZE:
+            self._head += chunk[:IMAGE_HEAD_SIZE - len(self._head)]
+            if len(self._head) == IMAGE_HEAD_SIZE and detect_image_format(self._head) is None:
+                raise ValueError("图片文件头校验失败")
+        self._file.write(chunk)
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+        downloaded_bytes.add(len(chunk))
+
+    def commit(self):
+        """
+        完成写入
+        :return: (字节数, sha256)
+        """
+        self._file.close()
+        if self.expected_length is not None and self.size != self.expected_length:
+            self.abort()
+            raise ValueError(f"图片不完整({self.size}/{self.expected_length}字节)")
+        if detect_image_format(self._head) is None:
+            self.abort()
+            raise ValueError("图片文件头校验失败")
+        os.replace(self._tmp_path, self.filepath)
+        return self.size, self._sha256.hexdigest()
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+def content_length(headers):
+    """获取未压缩响应的Content-Length，无法确定时返回None"""
+    value = headers.get("Content-Length")
+    if value is None or headers.get("Content-Encoding"):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+class ChapterManifest:
+    """
+    章节下载清单：记录每页图片的URL、字节数和sha256
+    重新运行时跳过已完整下载并校验通过的图片，只重新下载缺失或损坏的图片
+    下载过程中每页追加一行到日志文件（manifest.journal），章节结束时再合并写入 manifest.json
+    """
+    FILE_NAME = "manifest.json"
+    JOURNAL_NAME = "manifest.journal"
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, self.FILE_NAME)
+        self.journal_path = os.path.join(output_dir, self.JOURNAL_NAME)
+        self.output_dir = output_dir
+        self.pages = {}
+        self._lock = threading.Lock()
+        self._journal = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.pages = json.load(f).get("pages", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"下载清单 {self.path} 读取失败，将重新下载: {e}")
+        self._replay_journal()
+
+    def _replay_journal(self):
+        """回放上次中断时未合并的日志记录（忽略写了一半的最后一行）"""
+        if not os.path.exists(self.journal_path):
+            return
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.pages[entry.pop("file")] = entry
+        except OSError as e:
+            logger.warning(f"下载清单日志 {self.journal_path} 读取失败: {e}")
+
+    def is_complete(self, filename):
+        """图片已下载且字节数与sha256均与清单一致"""
+        entry = self.pages.get(filename)
+        filepath = os.path.join(self.output_dir, filename)
+        if not entry or not os.path.exists(filepath):
+            return False
+        if os.path.getsize(filepath) != entry["size"]:
+            return False
+        with open(filepath, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest() == entry["sha256"]
+
+    def record(self, filename, url, size, sha256, **extra):
+        """记录已下载的图片，追加一行到清单日志"""
+        entry = {
+            "url": url,
+            "size": size,
+            "sha256": sha256,
+            **extra,
+        }
+        with self._lock:
+            self.pages[filename] = entry
+            if self._journal is None:
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(json.dumps({"file": filename, **entry}, ensure_ascii=False) + "\n")
+            self._journal.flush()
+
+    def save(self):
+        """章节结束时将清单合并写入 manifest.json 并删除日志"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            elif not os.path.exists(self.journal_path):
+                return
+            atomic_write(self.path, json.dumps({"pages": self.pages}, ensure_ascii=False, indent=1).encode("utf-8"))
+            os.remove(self.journal_path)
+
+class PageStore:
+    """
+    内容寻址图片存储：图片按sha256保存在 objects/前2位/sha256，章节目录中的图片为指向它的硬链接
+    - 记录 图片URL -> sha256，已下载过的URL直接链接，不再请求网络
+    - 下载后内容与已有图片相同(片头、广告、重复下载等)时改为链接，只保存一份
+    - 不支持硬链接时退化为复制
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stats = {"linked": 0, "linked_bytes": 0, "duplicate": 0, "duplicate_bytes": 0, "stored": 0, "stored_bytes": 0}
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.root, "index.db"), check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL)")
+        return self._conn
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    @staticmethod
+    def _link(src, dst):
+        """将src链接(或复制)到dst，原子替换已有文件（临时文件名唯一，多个线程可同时链接同一个文件）"""
+        tmp_path = f"{dst}.{uuid.uuid4().hex}.part"
+        try:
+            try:
+                os.link(src, tmp_path)
+            except OSError:
+                shutil.copyfile(src, tmp_path)
+            os.replace(tmp_path, dst)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _store(self, src, blob, size):
+        """
+        将src保存为新的blob
+        :return: 是否由本次保存；其他线程已同时保存了相同内容时返回False
+        """
+        try:
+            os.link(src, blob)
+            return True
+        except FileExistsError:
+            if os.path.getsize(blob) == size:
+                return False
+        except OSError:
+            pass
+        # 不支持硬链接或已有的blob不完整时复制/替换
+        self._link(src, blob)
+        return True
+
+    def _count(self, key, size):
+        with self._lock:
+            self._stats[key] += 1
+            self._stats[key + "_bytes"] += size
+
+    def restore(self, url, filepath):
+        """
+        URL已保存过时直接从存储中链接图片
+        :return: (字节数, sha256)，未保存过返回None
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT sha256, size FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        sha256, size = row
+        blob = self.blob_path(sha256)
+        if not os.path.exists(blob) or os.path.getsize(blob) != size:
+            return None
+        self._link(blob, filepath)
+        self._count("linked", size)
+        return size, sha256
+
+    def add(self, url, filepath, size, sha256):
+        """保存刚下载的图片：内容已存在时将filepath替换为链接，否则将其链接进存储"""
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob) and os.path.getsize(blob) == size:
+            self._link(blob, filepath)
+            self._count("duplicate", size)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            if self._store(filepath, blob, size):
+                self._count("stored", size)
+            else:
+                self._link(blob, filepath)
+                self._count("duplicate", size)
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO urls (url, sha256, size) VALUES (?, ?, ?)", (url, sha256, size))
+            conn.commit()
+
+    def log_stats(self, out_dir="./out"):
+        with self._lock:
+            stats = dict(self._stats)
+        pages = stats["linked"] + stats["duplicate"] + stats["stored"]
+        if not pages:
+            return
+        saved = stats["linked_bytes"] + stats["duplicate_bytes"]
+        total = saved + stats["stored_bytes"]
+        logger.info(f"图片存储统计: 共 {pages} 张，URL命中跳过下载 {stats['linked']} 张，"
+                    f"内容重复 {stats['duplicate']} 张，新增 {stats['stored']} 张；"
+                    f"去重率 {saved / total:.1%}，节省 {saved / 1024 / 1024:.1f} MB")
+        # out目录中硬链接的文件只占用一份磁盘空间；上传工件和打包压缩包时仍按完整大小复制
+        apparent = 0
+        inodes = {}
+        for root, _, files in os.walk(out_dir):
+            for name in files:
+                st = os.stat(os.path.join(root, name))
+                apparent += st.st_size
+                inodes[(st.st_dev, st.st_ino)] = st.st_size
+        logger.info(f"out目录硬链接节省本地磁盘 {(apparent - sum(inodes.values())) / 1024 / 1024:.1f} MB"
+                    f"（上传和打包大小不变）")
+
+page_store = PageStore(PAGE_STORE_DIR)
+
+def restore_page(img_url, filepath, manifest):
+    """开启图片存储时，从存储中恢复已下载过的图片并记录到清单"""
+    if page_store_switch != 1:
+        return False
+    restored = page_store.restore(img_url, filepath)
+    if restored is None:
+        return False
+    manifest.record(os.path.basename(filepath), img_url, *restored)
+    return True
+
+class PageScheduler:
+    """
+    全局图片下载调度器：所有章节(包括不同漫画)的图片共用一组下载线程
+    - 空闲线程直接领取下一个章节的图片，不必等待上一章最慢的图片
+    - 优先下载剩余图片最少(最接近完成)的章节，使PDF生成和进度提交尽早进行
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._jobs = []
+        self._threads = []
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def configure(self, workers):
+        with self._cond:
+            self.workers = workers
+            self._cond.notify_all()
+
+    def _ensure_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"page-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, tasks, done_count=0):
+        """
+        提交一个章节的图片下载任务
+        :param tasks: 无参数的下载函数列表，返回是否成功
+        :param done_count: 已完成(无需下载)的图片数
+        :return: Future，结果为成功的图片数(包含done_count)
+        """
+        future = Future()
+        if not tasks:
+            future.set_result(done_count)
+            return future
+        with self._cond:
+            self._seq += 1
+            self._jobs.append({"seq": self._seq, "pending": list(reversed(tasks)), "remaining": len(tasks),
+                               "success": done_count, "future": future})
+            self._ensure_workers()
+            self._cond.notify_all()
+        return future
+
+    def cancel(self, future):
+        """
+        取消章节中尚未开始的图片（正在下载的图片完成后章节结束）
+        :param future: submit返回的Future
+        :return: 是否找到该章节
+        """
+        with self._cond:
+            for job in self._jobs:
+                if job["future"] is future:
+                    job["remaining"] -= len(job["pending"])
+                    job["pending"] = []
+                    if job["remaining"] == 0:
+                        self._jobs.remove(job)
+                        job["future"].set_result(job["success"])
+                    return True
+        return False
+
+    def _next_task(self):
+        with self._cond:
+            while True:
+                # 线程数调小后多余的线程退出
+                if self._threads.index(threading.current_thread()) >= self.workers:
+                    self._threads.remove(threading.current_thread())
+                    return None, None
+                ready = [job for job in self._jobs if job["pending"]]
+                if ready:
+                    job = min(ready, key=lambda item: (item["remaining"], item["seq"]))
+                    return job, job["pending"].pop()
+                self._cond.wait()
+
+    def _worker(self):
+        while True:
+            job, task = self._next_task()
+            if job is None:
+                return
+            try:
+                success = task()
+            except Exception as e:
+                logger.warning(f"下载图片时发生异常: {e}")
+                success = False
+            with self._cond:
+                job["remaining"] -= 1
+                if success:
+                    job["success"] += 1
+                if job["remaining"] == 0:
+                    self._jobs.remove(job)
+                    job["future"].set_result(job["success"])
+
+page_scheduler = PageScheduler(download_workers)
+
+class HedgePolicy:
+    """
+    对冲请求策略（仅线程池下载引擎）：图片超过自适应阈值(近期每页耗时的p95)仍未下载完成时，
+    再发一次相同的请求，使用先成功的结果并放弃另一个
+    对冲请求数不超过图片请求数的ratio，CDN整体变慢时不会成倍增加负载
+    """
+    WINDOW = 200 #计算阈值使用的最近耗时样本数
+    MIN_SAMPLES = 20 #样本不足时不发起对冲
+
+    def __init__(self):
+        self.enabled = False
+        self.ratio = 0.1
+        self.min_delay = 0.5
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self._samples = deque(maxlen=self.WINDOW)
+        self._active = set() #下载中图片的放弃标记
+        self._lock = threading.Lock()
+        self.commit_lock = threading.Lock() #原请求与对冲请求只有先完成的一方写入图片
+
+    def configure(self, enabled=None, ratio=None, min_delay=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if ratio is not None:
+                self.ratio = ratio
+            if min_delay is not None:
+                self.min_delay = min_delay
+
+    def observe(self, seconds):
+        """记录一张图片的下载耗时"""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def threshold(self):
+        """当前对冲阈值(秒)，样本不足时返回None"""
+        with self._lock:
+            if len(self._samples) < self.MIN_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+        return max(RunMetrics.percentile(samples, 0.95), self.min_delay)
+
+    def start_request(self):
+        """
+        登记一次图片请求
+        :return: 对冲阈值(秒)，未开启或样本不足时返回None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self.requests += 1
+        return self.threshold()
+
+    def try_fire(self):
+        """在对冲配额内登记一次对冲请求，超出配额返回False"""
+        with self._lock:
+            if self.fired + 1 > self.ratio * self.requests:
+                return False
+            self.fired += 1
+        metrics.count("page_hedges", "fired")
+        return True
+
+    def record_won(self):
+        with self._lock:
+            self.won += 1
+        metrics.count("page_hedges", "won")
+
+    def submit(self, func, *args):
+        """
+        在后台线程中执行请求（原请求和对冲请求都在其中执行，调用线程只负责等待）
+        使用daemon线程：落后的请求仍在等待响应头时不会推迟程序退出
+        :return: Future
+        """
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="hedge", daemon=True).start()
+        return future
+
+    def register(self, cancel):
+        with self._lock:
+            self._active.add(cancel)
+
+    def unregister(self, cancel):
+        with self._lock:
+            self._active.discard(cancel)
+
+    def shutdown(self):
+        """下载结束时放弃所有仍在进行的请求（已读取的数据不再写入）"""
+        with self._lock:
+            active = list(self._active)
+            self._active.clear()
+        for cancel in active:
+            cancel.set()
+
+    def log_stats(self):
+        if not self.requests:
+            return
+        threshold = self.threshold()
+        logger.info(f"对冲请求统计: 图片请求 {self.requests} 次，对冲 {self.fired} 次({self.fired / self.requests:.1%})，"
+                    f"对冲胜出 {self.won} 次，当前阈值 {threshold or 0:.2f} 秒")
+
+hedge_policy = HedgePolicy()
+
+def submit_images_multithreaded(contents, words, output_dir, headers):
+    """
+    将章节图片提交到全局下载调度器（已下载且校验通过的图片直接跳过）
     :param contents: 图片信息列表
     :param words: 图片索引列表
     :param output_dir: 输出目录
     :param headers: 请求头
-    :param max_workers: 最大线程数
-    :return: 成功下载的图片数量
+    :return: Future，结果为成功下载的图片数量
     """
     success_count = 0
+    linked_count = 0
     failed_pages = []
-    
-    # 创建线程池
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 提交下载任务
-        future_to_page = {}
-        for i, word_index in enumerate(words):
-            page_num = i + 1
-            filename = f"{page_num:03d}.jpg"
-            filepath = os.path.join(output_dir, filename)
-            
-            future = executor.submit(download_single_image, contents[word_index]["url"], filepath, headers, page_num, len(contents))
-            future_to_page[future] = page_num
-    
-        # 处理完成的任务
-        for future in as_completed(future_to_page):
-            page_num = future_to_page[future]
-            try:
-                success = future.result()
-                if success:
-                    success_count += 1
-                else:
-                    failed_pages.append(page_num)
-            except Exception as e:
-                logger.warning(f"下载第 {page_num} 页时发生异常: {e}")
+    manifest = ChapterManifest(output_dir)
+
+    def page_task(img_url, filepath, page_num):
+        def task():
+            success = download_single_image(img_url, filepath, headers, page_num, len(contents), manifest)
+            if not success:
                 failed_pages.append(page_num)
-    
-    if failed_pages:
-        logger.warning(f"以下页面下载失败: {failed_pages}")
-    
-    return success_count
+            download_progress.advance(output_dir, failed=not success)
+            return success
+        return task
+
+    tasks = []
+    for i, word_index in enumerate(words):
+        page_num = i + 1
+        filename = f"{page_num:03d}.jpg"
+        filepath = os.path.join(output_dir, filename)
+        if manifest.is_complete(filename):
+            success_count += 1
+            continue
+        if restore_page(contents[word_index]["url"], filepath, manifest):
+            linked_count += 1
+            continue
+        tasks.append(page_task(contents[word_index]["url"], filepath, page_num))
 
+    if success_count:
+        logger.info(f"已跳过 {success_count} 张校验通过的图片")
+    if linked_count:
+        logger.info(f"已从图片存储链接 {linked_count} 张图片")
+    download_progress.advance(output_dir, success_count + linked_count)
 
-def download_single_image(img_url, filepath, headers, page_num, total_pages):
+    future = page_scheduler.submit(tasks, success_count + linked_count)
+
+    def log_failed(_):
+        manifest.save()
+        if failed_pages:
+            logger.warning(f"以下页面下载失败: {sorted(failed_pages)}")
+
+    future.add_done_callback(log_failed)
+    return future
+
+def fetch_page(img_url, filepath, headers, cancel=None, suffix=".part"):
+    """
+    请求并保存单张图片（单次请求，不重试）
+    :param cancel: threading.Event，设置后在下一个数据块时放弃下载（对冲请求中落后的一方）
+    :param suffix: 临时文件后缀，原请求和对冲请求各自写入不同的临时文件
+    :return: (字节数, sha256)
+    """
+    with http_client.get(img_url, headers=headers, stream=True) as response:
+        if response.status_code != 200:
+            raise requests.exceptions.HTTPError(f"HTTP {response.status_code}", response=response)
+        # 流式保存图片，内存中只保留一个数据块
+        writer = PageWriter(filepath, content_length(response.headers), suffix)
+        try:
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                if cancel is not None and cancel.is_set():
+                    raise RuntimeError("对冲请求已完成，放弃下载")
+                writer.write(chunk)
+            if cancel is None:
+                return writer.commit()
+            # 读完最后一个数据块时另一方可能已完成，只有先完成的一方写入图片，
+            # 否则会覆盖已链接到图片存储或已转码的图片
+            with hedge_policy.commit_lock:
+                if cancel.is_set():
+                    raise RuntimeError("对冲请求已完成，放弃下载")
+                result = writer.commit()
+                cancel.set()
+            return result
+        except BaseException:
+            writer.abort()
+            raise
+
+def fetch_page_hedged(img_url, filepath, headers):
+    """
+    请求并保存单张图片，开启对冲时超过阈值仍未完成则再请求一次，使用先成功的结果
+    :return: (字节数, sha256)
+    """
+    threshold = hedge_policy.start_request()
+    if threshold is None:
+        return fetch_page(img_url, filepath, headers)
+    cancel = threading.Event()
+    hedge_policy.register(cancel)
+    try:
+        primary = hedge_policy.submit(fetch_page, img_url, filepath, headers, cancel)
+        done, _ = wait([primary], timeout=threshold)
+        if done or not hedge_policy.try_fire():
+            return primary.result()
+        hedge = hedge_policy.submit(fetch_page, img_url, filepath, headers, cancel, ".hedge.part")
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 一方失败时继续等待另一方，都失败时按原请求的错误重试
+                    if error is None or future is primary:
+                        error = e
+                    continue
+                if future is hedge:
+                    hedge_policy.record_won()
+                return result
+        raise error
+    finally:
+        cancel.set()
+        hedge_policy.unregister(cancel)
+
+def download_single_image(img_url, filepath, headers, page_num, total_pages, manifest=None):
     """
     下载单张图片
     :param img_url: 图片URL
@@ -576,67 +2641,357 @@ def download_single_image(img_url, filepath, headers, page_num, total_pages):
     :param headers: 请求头
     :param page_num: 页码
     :param total_pages: 总页数
+    :param manifest: 章节下载清单，下载成功后记录
     :return: 是否下载成功
     """
     retry_count = 0
     max_retries = 5
     success = False
-    
+
     while retry_count < max_retries and not success:
+        started = time.perf_counter()
         try:
-            logger.info(f"正在下载第 {page_num:03d}/{total_pages:03d} 页...",)
-            response = requests.get(img_url, headers=headers, timeout=30)
-            if response.status_code == 200:
-                # 保存图片
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
-                #logger.info("✓ 成功")
-                success = True
-            else:
-                retry_count += 1
-                if retry_count < max_retries:
-                    logger.warning(f"✗ 失败 (HTTP {response.status_code})，正在尝试第 {retry_count+1}/{max_retries} 次重试...")
-                    time.sleep(1)
-                else:
-                    logger.warning(f"✗ 失败 (HTTP {response.status_code})，已达到最大重试次数")
-        except requests.exceptions.Timeout:
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.warning(f"✗ 失败 (请求超时)，正在尝试第 {retry_count+1}/{max_retries} 次重试...")
-                time.sleep(1)
-            else:
-                logger.warning(f"✗ 失败 (请求超时)，已达到最大重试次数")
-        except requests.exceptions.ConnectionError:
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.warning(f"✗ 失败 (连接错误)，正在尝试第 {retry_count+1}/{max_retries} 次重试...")
-                time.sleep(0.1)
-            else:
-                logger.warning(f"✗ 失败 (连接错误)，已达到最大重试次数")
+            size, sha256 = fetch_page_hedged(img_url, filepath, headers)
+            if page_store_switch == 1:
+                page_store.add(img_url, filepath, size, sha256)
+            if manifest is not None:
+                manifest.record(os.path.basename(filepath), img_url, size, sha256)
+            elapsed = time.perf_counter() - started
+            metrics.observe("page", elapsed)
+            hedge_policy.observe(elapsed)
+            success = True
+            break
+        except requests.exceptions.HTTPError as e:
+            reason = str(e)
+            cause = failure_cause(status=e.response.status_code)
+        except requests.exceptions.Timeout as e:
+            reason = "请求超时"
+            cause = failure_cause(e)
+        except requests.exceptions.ConnectionError as e:
+            reason = "连接错误"
+            cause = failure_cause(e)
         except Exception as e:
-            retry_count += 1
-            if retry_count < max_retries:
-                logger.warning(f"✗ 失败 ({str(e)})，正在尝试第 {retry_count+1}/{max_retries} 次重试...")
-                time.sleep(1)
-            else:
-                logger.warning(f"✗ 失败 ({str(e)})，已达到最大重试次数")
-        
-        if not success:
-            time.sleep(0.5)  # 每次重试后稍作延迟
-    
+            reason = str(e)
+            cause = failure_cause(e)
+
+        retry_count += 1
+        if retry_count < max_retries:
+            # 指数退避+抖动；Retry-After由限速器统一处理
+            delay = backoff_delay(retry_count)
+            logger.warning(f"第 {page_num:03d}/{total_pages:03d} 页 ✗ 失败 ({reason})，{delay:.1f} 秒后进行第 {retry_count+1}/{max_retries} 次重试...")
+            metrics.count("page_retries", cause)
+            time.sleep(delay)
+        else:
+            logger.warning(f"第 {page_num:03d}/{total_pages:03d} 页 ✗ 失败 ({reason})，已达到最大重试次数")
+            metrics.count("page_failures", cause)
+
     return success
 
 
-def download_comic_image(start, end, path):
-    while True:
-        # 首先获取章节信息,根据start计算页码
-        page = int((start-1 )/ 50 + 1)
-        results = get_chapters(path, page)
-        res = handle_chapters_results(results,start,end,path)
-        if page*50 >= end:
-            break
-        start += 50
-    return res
+class ByteBudget:
+    """asyncio字节预算：内存中未写盘的字节数超过上限时阻塞新的读取（背压）"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, size):
+        async with self._cond:
+            # 单个超过上限的图片在没有其他数据时也允许读取，避免死锁
+            await self._cond.wait_for(lambda: self.in_flight == 0 or self.in_flight + size <= self.limit)
+            self.in_flight += size
+
+    async def release(self, size):
+        async with self._cond:
+            self.in_flight -= size
+            self._cond.notify_all()
+
+class AsyncDownloadEngine:
+    """
+    asyncio图片下载引擎
+    - 后台线程中只运行一个事件循环，所有章节的图片共用一个aiohttp会话
+    - 全局并发上限作用于所有章节的图片请求
+    - 字节预算限制内存中未写盘的数据量
+    """
+    DEFAULT_PAGE_SIZE = 1024 * 1024 #未返回Content-Length时按1MB预估
+
+    def __init__(self, concurrency, max_inflight_bytes):
+        self.concurrency = concurrency
+        self.max_inflight_bytes = max_inflight_bytes
+        self.requests = 0
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._semaphore = None
+        self._budget = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="async-download", daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    async def _setup(self):
+        import aiohttp
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._budget = ByteBudget(self.max_inflight_bytes)
+        self._session = aiohttp.ClientSession(
+            headers=COPY_HEADERS,
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(sock_connect=http_connect_timeout, sock_read=http_read_timeout),
+        )
+
+    async def _download_page(self, img_url, filepath, page_num, total_pages, manifest, max_retries=5):
+        for attempt in range(1, max_retries + 1):
+            status = None
+            try:
+                async with self._semaphore:
+                    await asyncio.sleep(rate_limiter.host(img_url).reserve())
+                    started = time.perf_counter()
+                    async with self._session.get(img_url) as response:
+                        self.requests += 1
+                        rate_limiter.feedback(img_url, response.status, parse_retry_after(response.headers.get("Retry-After")))
+                        if response.status != 200:
+                            status = response.status
+                            raise RuntimeError(f"HTTP {response.status}")
+                        size = response.content_length or self.DEFAULT_PAGE_SIZE
+                        await self._budget.acquire(size)
+                        try:
+                            data = await response.read()
+                            await asyncio.to_thread(self._write, filepath, img_url, data,
+                                                    content_length(response.headers), manifest)
+                        finally:
+                            await self._budget.release(size)
+                    metrics.observe("page", time.perf_counter() - started)
+                return True
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    reason = "请求超时"
+                    rate_limiter.feedback(img_url)
+                else:
+                    reason = str(e)
+                cause = failure_cause(e, status)
+                if attempt < max_retries:
+                    delay = backoff_delay(attempt)
+                    logger.warning(f"第 {page_num:03d}/{total_pages:03d} 页 ✗ 失败 ({reason})，{delay:.1f} 秒后进行第 {attempt+1}/{max_retries} 次重试...")
+                    metrics.count("page_retries", cause)
+                    await asyncio.sleep(delay)
+                else:
+                    logger.warning(f"第 {page_num:03d}/{total_pages:03d} 页 ✗ 失败 ({reason})，已达到最大重试次数")
+                    metrics.count("page_failures", cause)
+        return False
+
+    @staticmethod
+    def _write(filepath, img_url, data, expected_length, manifest):
+        writer = PageWriter(filepath, expected_length)
+        try:
+            writer.write(data)
+            size, sha256 = writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+        if page_store_switch == 1:
+            page_store.add(img_url, filepath, size, sha256)
+        manifest.record(os.path.basename(filepath), img_url, size, sha256)
+
+    async def _download_tracked(self, output_dir, *args):
+        success = await self._download_page(*args)
+        download_progress.advance(output_dir, failed=not success)
+        return success
+
+    async def _download_chapter(self, contents, words, output_dir):
+        manifest = await asyncio.to_thread(ChapterManifest, output_dir)
+        tasks = []
+        skipped = 0
+        linked = 0
+        for i, word_index in enumerate(words):
+            page_num = i + 1
+            filename = f"{page_num:03d}.jpg"
+            if await asyncio.to_thread(manifest.is_complete, filename):
+                skipped += 1
+                continue
+            filepath = os.path.join(output_dir, filename)
+            if await asyncio.to_thread(restore_page, contents[word_index]["url"], filepath, manifest):
+                linked += 1
+                continue
+            tasks.append(self._download_tracked(output_dir, contents[word_index]["url"], filepath, page_num, len(contents), manifest))
+        if skipped:
+            logger.info(f"已跳过 {skipped} 张校验通过的图片")
+        if linked:
+            logger.info(f"已从图片存储链接 {linked} 张图片")
+        download_progress.advance(output_dir, skipped + linked)
+        results = await asyncio.gather(*tasks)
+        await asyncio.to_thread(manifest.save)
+        failed_count = len([success for success in results if not success])
+        if failed_count:
+            logger.warning(f"共 {failed_count} 页下载失败")
+        return len(words) - failed_count
+
+    def submit(self, contents, words, output_dir):
+        """
+        提交一个章节的所有图片（可同时提交多个章节，共享全局并发上限）
+        :return: Future，结果为成功下载的图片数量
+        """
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._download_chapter(contents, words, output_dir), self._loop)
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+        logger.info(f"async下载引擎统计: 请求 {self.requests} 次")
+
+async_engine = None
+output_executor = None
+run_outputs = [] #本次运行已完成的章节输出(按章节顺序)，供打包使用
+
+def require_aiohttp():
+    """download_engine为async时检查aiohttp（可选依赖）已安装，未安装则报错退出"""
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        message = "download_engine: async 需要安装aiohttp: pip install -r requirements-async.txt（或改为 download_engine: thread）"
+        logger.error(message)
+        raise SystemExit(message)
+
+def get_async_engine():
+    """获取async下载引擎（首次调用时创建）"""
+    global async_engine
+    if async_engine is None:
+        async_engine = AsyncDownloadEngine(async_concurrency, async_max_inflight_mb * 1024 * 1024)
+    return async_engine
+
+def submit_chapter_images(contents, words, output_dir):
+    """
+    按配置的下载引擎提交章节图片下载（不等待下载完成）
+    :return: Future，结果为成功下载的图片数量
+    """
+    if download_engine == "async":
+        return get_async_engine().submit(contents, words, output_dir)
+    return submit_images_multithreaded(contents, words, output_dir, COPY_HEADERS)
+
+def cancel_chapter_images(future):
+    """取消submit_chapter_images提交的章节中尚未开始下载的图片"""
+    if not page_scheduler.cancel(future):
+        # async引擎的章节为协程，取消后正在进行的请求也会中止
+        future.cancel()
+
+def close_download_engine():
+    """关闭async下载引擎（如已启动）"""
+    if async_engine is not None:
+        async_engine.close()
+
+def download_comic_image(start, end, path, stop_on_failure=False, on_success=None, comic_config=None):
+    """
+    下载start~end范围内的所有章节
+    :return: 每个章节的下载结果[(章节序号, 是否成功)]
+    """
+    chapters = collect_chapters(path, start, end)
+    if len(chapters) < end - start + 1:
+        logger.warning(f"仅获取到 {len(chapters)}/{end - start + 1} 个章节信息")
+    return handle_chapters_results(chapters, path, stop_on_failure, on_success, comic_config)
+
+def pack_entry_files(output_path):
+    """
+    章节输出在压缩包中的文件列表
+    :return: [(文件路径, 压缩包内路径)]
+    """
+    output_path = os.path.abspath(output_path).rstrip('/\\')
+    comic_name = os.path.basename(os.path.dirname(output_path))
+    name = os.path.basename(output_path)
+    if os.path.isfile(output_path):
+        return [(output_path, f"{comic_name}/{name}")]
+    files = []
+    for file in sorted(os.listdir(output_path)):
+        if file in (ChapterManifest.FILE_NAME, ChapterManifest.JOURNAL_NAME) or file.endswith(".part"):
+            continue
+        files.append((os.path.join(output_path, file), f"{comic_name}/{name}/{file}"))
+    return files
+
+def scan_out_dir(out_dir="./out"):
+    """扫描输出目录（供pack命令手动打包）：按漫画名分组，章节按生成时间排序"""
+    outputs = []
+    if not os.path.isdir(out_dir):
+        return outputs
+    for comic_name in sorted(os.listdir(out_dir)):
+        comic_dir = os.path.join(out_dir, comic_name)
+        if not os.path.isdir(comic_dir):
+            continue
+        entries = [os.path.join(comic_dir, name) for name in os.listdir(comic_dir) if not name.endswith(".part")]
+        # 已生成输出文件的章节只打包输出文件
+        outputs_files = {os.path.splitext(entry)[0] for entry in entries if os.path.isfile(entry)}
+        entries = [entry for entry in entries if os.path.isfile(entry) or entry not in outputs_files]
+        outputs.extend(sorted(entries, key=os.path.getmtime))
+    return outputs
+
+def pack_outputs(outputs=None, pack_dir=PACK_DIR, max_bytes=None):
+    """
+    将章节输出按顺序直接写入多个不超过大小上限的压缩包（不额外复制）
+    同一漫画的章节连续存放，章节不会被拆分到两个压缩包
+    :param outputs: 章节输出路径列表，None时使用本次运行记录（不扫描./out，避免重复发送以前的章节）
+    :param max_bytes: 单个压缩包字节上限，None时使用pack_max_mb
+    :return: 打包清单
+    """
+    if outputs is None:
+        outputs = run_outputs
+    if max_bytes is None:
+        max_bytes = int(pack_max_mb * 1024 * 1024)
+    os.makedirs(pack_dir, exist_ok=True)
+    for file in os.listdir(pack_dir):
+        if file.startswith(PACK_PREFIX) and file.endswith(".zip") or file == PACK_MANIFEST:
+            os.remove(os.path.join(pack_dir, file))
+
+    # 按漫画分组（保持首次出现的顺序），组内保持章节顺序
+    groups = {}
+    for output_path in outputs:
+        comic_name = os.path.basename(os.path.dirname(os.path.abspath(output_path).rstrip('/\\')))
+        groups.setdefault(comic_name, []).append(output_path)
+
+    parts = []
+    current = None
+    for comic_name, chapter_outputs in groups.items():
+        for output_path in chapter_outputs:
+            files = pack_entry_files(output_path)
+            # 预估压缩包大小：文件大小 + 本地文件头和中央目录的开销
+            size = sum(os.path.getsize(file) + 76 + 2 * len(arcname.encode("utf-8")) for file, arcname in files)
+            if current is None or (current["size"] + size + 22 > max_bytes and current["chapters"]):
+                current = {"files": [], "chapters": [], "size": 0}
+                parts.append(current)
+            current["files"].extend(files)
+            current["chapters"].append({"comic": comic_name, "chapter": os.path.basename(output_path)})
+            current["size"] += size
+
+    manifest = {"max_bytes": max_bytes, "parts": []}
+    for number, part in enumerate(parts, start=1):
+        file_name = f"{PACK_PREFIX}{number:02d}.zip"
+        archive_path = os.path.join(pack_dir, file_name)
+        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_STORED) as zf:
+            for file, arcname in part["files"]:
+                zf.write(file, arcname)
+        size = os.path.getsize(archive_path)
+        oversize = size > max_bytes
+        if oversize:
+            logger.warning(f"压缩包 {file_name} 超过大小上限（单个章节过大）: {size / 1024 / 1024:.1f} MB")
+        manifest["parts"].append({
+            "file": file_name,
+            "size": size,
+            "oversize": oversize,
+            "chapters": part["chapters"],
+        })
+        logger.info(f"已生成压缩包 {file_name}: {len(part['chapters'])} 章，{size / 1024 / 1024:.1f} MB")
+    with open(os.path.join(pack_dir, PACK_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
 
 def print_main_menu():
     """
@@ -682,8 +3037,10 @@ def view_comic_detail_function():
     input("回车返回首页: ")
 
 def get_latest_chapter(path):
-    """获取最新章节数量"""
-    results = get_chapters(path,1)
+    """获取最新章节数量（开启章节索引时同时增量同步）"""
+    if chapter_index_switch == 1:
+        return chapter_index.sync(path)
+    results = get_chapters(path,1,refresh=True)
     if not results:
         logger.warning("没有获取到结果")
         return 0
@@ -729,7 +3086,14 @@ def download_comic_function():
             if end_num > total or end_num < start_num:
                 print("输入错误，请输入最大章节内的数字,并大于起始章节数")
                 continue
-            download_comic_image(start_num, end_num,path)
+            report = download_comic_image(start_num, end_num,path)
+            shutdown_output_executor()
+            print_download_report(report)
+            http_client.log_stats()
+            rate_limiter.log_stats()
+            api_cache.log_stats()
+            page_store.log_stats()
+            hedge_policy.log_stats()
         elif is_obtain.lower() == "n":
             break
     input("回车返回首页: ")
@@ -799,6 +3163,7 @@ def generate_default_config():
         },
         "comics": []
     }
+    import yaml
     os.makedirs(os.path.dirname(CONFIG_PATH), exist_ok=True)
     with open(CONFIG_PATH, "w", encoding="utf-8") as f:
         yaml.safe_dump(default_config, f, indent=2, allow_unicode=True,sort_keys=False)
@@ -810,16 +3175,339 @@ def load_config():
         generate_default_config()
         # 生成默认配置后，提示用户修改并退出（避免直接运行示例配置报错）
         exit(0)
+    import yaml
     with open(CONFIG_PATH, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
-def save_config(config):
-    """更新YAML配置/状态文件（覆盖写入）"""
-    with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-        yaml.safe_dump(config, f, indent=2, allow_unicode=True,sort_keys=False)
+class StateStore:
+    """
+    订阅状态存储(SQLite WAL)：保存每部漫画的 last_chapter/last_check_time
+    comic.yaml 只作为手动编辑的配置，不再在运行中反复覆盖写入
+    - 状态更新批量提交(达到条数或间隔时间时提交)，中断时最多重复下载少量已完成章节
+    - comic.yaml 中的 last_chapter 视为订阅起始章节，被手动修改后以配置为准重新开始
+    - 数据库不提交到Git，导出为YAML快照(state.yaml)提交；数据库不存在或落后于快照时从快照恢复
+    """
+
+    def __init__(self, db_path, batch_size=20, batch_seconds=5):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self._conn = None
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS subscriptions (
+                    path TEXT PRIMARY KEY,
+                    name TEXT,
+                    start_chapter INTEGER NOT NULL,
+                    last_chapter INTEGER NOT NULL,
+                    last_check_time TEXT
+                );
+            """)
+        return self._conn
+
+    @staticmethod
+    def read_snapshot(snapshot_path):
+        """读取YAML快照，返回{漫画路径: 状态}"""
+        if not snapshot_path or not os.path.exists(snapshot_path):
+            return {}
+        import yaml
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            items = yaml.safe_load(f) or []
+        return {item["path"]: item for item in items}
+
+    def load(self, comics, snapshot_path=None):
+        """
+        将保存的状态合并到漫画配置中（直接修改comics）
+        没有记录的漫画依次从YAML快照、comic.yaml初始化；
+        数据库(缓存中恢复)落后于已提交的快照时以快照为准
+        """
+        snapshot = self.read_snapshot(snapshot_path)
+        with self._lock:
+            conn = self._connect()
+            for comic in comics:
+                path = comic["path"]
+                start_chapter = comic["last_chapter"]
+                row = conn.execute("SELECT start_chapter, last_chapter, last_check_time FROM subscriptions WHERE path = ?",
+                                   (path,)).fetchone()
+                item = snapshot.get(path)
+                if item and item.get("start_chapter") != start_chapter:
+                    item = None
+                if row is not None and row[0] != start_chapter:
+                    # comic.yaml中的起始章节被手动修改，从新的章节重新开始
+                    row = None
+                    item = None
+                if row is None or (item and item["last_chapter"] > row[1]):
+                    if item:
+                        row = (start_chapter, item["last_chapter"], item.get("last_check_time"))
+                    else:
+                        row = (start_chapter, start_chapter, comic.get("last_check_time"))
+                    conn.execute("INSERT OR REPLACE INTO subscriptions (path, name, start_chapter, last_chapter, last_check_time) "
+                                 "VALUES (?, ?, ?, ?, ?)", (path, comic["name"]) + row)
+                comic["last_chapter"] = row[1]
+                comic["last_check_time"] = row[2]
+            conn.commit()
+            self._pending = 0
+            self._last_commit = time.monotonic()
+
+    def update(self, path, **fields):
+        """更新一部漫画的状态(last_chapter/last_check_time)，按批提交"""
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"UPDATE subscriptions SET {columns} WHERE path = ?", tuple(fields.values()) + (path,))
+            self._pending += 1
+            if self._pending >= self.batch_size or time.monotonic() - self._last_commit >= self.batch_seconds:
+                self._commit()
+
+    def _commit(self):
+        with metrics.span("state.commit"):
+            self._conn.commit()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            if self._conn is not None and self._pending:
+                self._commit()
+
+    def export(self, snapshot_path):
+        """导出所有订阅状态为YAML快照"""
+        import yaml
+        self.flush()
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT name, path, start_chapter, last_chapter, last_check_time FROM subscriptions ORDER BY rowid").fetchall()
+        items = [{"name": name, "path": path, "start_chapter": start_chapter, "last_chapter": last_chapter,
+                  "last_check_time": last_check_time}
+                 for name, path, start_chapter, last_chapter, last_check_time in rows]
+        os.makedirs(os.path.dirname(snapshot_path) or ".", exist_ok=True)
+        atomic_write(snapshot_path, yaml.safe_dump(items, indent=2, allow_unicode=True, sort_keys=False).encode("utf-8"))
+        logger.info(f"订阅状态已导出 → {snapshot_path}")
+
+    def close(self):
+        """提交未保存的状态并合并WAL文件（数据库文件可直接复制或缓存）"""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.commit()
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+            self._conn = None
+            self._pending = 0
+
+state_store = StateStore(STATE_DB_PATH)
+
+def optional_setting(value):
+    """配置文件中写作None的可选项(YAML读取为字符串"None")或空值视为未设置"""
+    if value is None or value == "" or value == "None":
+        return None
+    return value
+
+def apply_global_config(global_config):
+    """将配置文件global部分的可选参数应用到全局变量（未配置则保持默认值）"""
+    global download_workers, http_connect_timeout, http_read_timeout, chapter_index_switch
+    global download_engine, async_concurrency, async_max_inflight_mb, pipeline_switch, pipeline_queue_size
+    global rate_limit_initial, rate_limit_min, rate_limit_max, output_workers, output_format, transcode
+    global api_cache_switch, api_cache_mb, page_store_switch, report_switch, metrics_textfile
+    global pack_max_mb, update_check_workers, quick_check_switch, plan_switch, download_budget_mb, plan_page_kb, plan_speed_mb
+    global log_format, hedge_switch, hedge_ratio, hedge_min_delay
+    download_workers = global_config.get("download_workers", download_workers)
+    http_connect_timeout = global_config.get("http_connect_timeout", http_connect_timeout)
+    http_read_timeout = global_config.get("http_read_timeout", http_read_timeout)
+    chapter_index_switch = global_config.get("chapter_index_switch", chapter_index_switch)
+    api_cache_switch = global_config.get("api_cache_switch", api_cache_switch)
+    page_store_switch = global_config.get("page_store_switch", page_store_switch)
+    report_switch = global_config.get("report_switch", report_switch)
+    metrics_textfile = optional_setting(global_config.get("metrics_textfile", metrics_textfile))
+    api_cache_mb = global_config.get("api_cache_mb", api_cache_mb)
+    pipeline_switch = global_config.get("pipeline_switch", pipeline_switch)
+    pipeline_queue_size = global_config.get("pipeline_queue_size", pipeline_queue_size)
+    output_workers = global_config.get("output_workers", output_workers)
+    output_format = global_config.get("output_format", output_format)
+    transcode = global_config.get("transcode", transcode)
+    pack_max_mb = global_config.get("pack_max_mb", pack_max_mb)
+    update_check_workers = global_config.get("update_check_workers", update_check_workers)
+    quick_check_switch = global_config.get("quick_check_switch", quick_check_switch)
+    plan_switch = global_config.get("plan_switch", plan_switch)
+    download_budget_mb = global_config.get("download_budget_mb", download_budget_mb)
+    plan_page_kb = global_config.get("plan_page_kb", plan_page_kb)
+    plan_speed_mb = global_config.get("plan_speed_mb", plan_speed_mb)
+    download_engine = global_config.get("download_engine", download_engine)
+    if download_engine == "async":
+        require_aiohttp()
+    async_concurrency = global_config.get("async_concurrency", async_concurrency)
+    async_max_inflight_mb = global_config.get("async_max_inflight_mb", async_max_inflight_mb)
+    rate_limit_initial = global_config.get("rate_limit_initial", rate_limit_initial)
+    rate_limit_min = global_config.get("rate_limit_min", rate_limit_min)
+    rate_limit_max = global_config.get("rate_limit_max", rate_limit_max)
+    hedge_switch = global_config.get("hedge_switch", hedge_switch)
+    hedge_ratio = global_config.get("hedge_ratio", hedge_ratio)
+    hedge_min_delay = global_config.get("hedge_min_delay", hedge_min_delay)
+    log_format = os.environ.get("MKK_LOG_FORMAT") or global_config.get("log_format", log_format)
+    configure_log_format(log_format)
+    # 对冲请求与原请求同时进行，需要额外的连接
+    http_client.configure(download_workers * 2 if hedge_switch == 1 else download_workers, http_connect_timeout, http_read_timeout)
+    page_scheduler.configure(download_workers)
+    rate_limiter.configure(rate_limit_initial, rate_limit_min, rate_limit_max)
+    hedge_policy.configure(hedge_switch == 1, hedge_ratio, hedge_min_delay)
+    api_cache.configure(api_cache_switch == 1, api_cache_mb * 1024 * 1024, global_config.get("api_cache_ttl"))
+
+def comic_fingerprint(data):
+    """由comic2接口的更新时间与最新章节生成变化标记"""
+    comic = data.get("results", {}).get("comic", {})
+    last_chapter = comic.get("last_chapter") or {}
+    return f"{comic.get('datetime_updated', '')}|{last_chapter.get('uuid') or last_chapter.get('name', '')}"
+
+def check_comic_update(path):
+    """
+    检查单部漫画的最新章节数
+    先用comic2接口(带ETag/If-Modified-Since条件请求)判断漫画是否变化，未变化时直接使用上次记录的章节数，
+    变化或无法判断时再获取完整章节列表
+    :return: (最新章节数(获取失败为0), 是否跳过了章节列表请求)
+    """
+    if quick_check_switch != 1:
+        return get_latest_chapter(path), False
+    marker = chapter_index.get_marker(path)
+    headers = {}
+    if marker and marker["etag"]:
+        headers["If-None-Match"] = marker["etag"]
+    if marker and marker["last_modified"]:
+        headers["If-Modified-Since"] = marker["last_modified"]
+    api_url = API_SCHEME + "://" + API_ADDER + "/api/v3/comic2/" + path
+    fingerprint = None
+    try:
+        with metrics.span("api.comic2_check"):
+            response = http_client.get(api_url, params={"platform": 1}, headers=headers)
+        if response.status_code == 304 and marker:
+            return marker["total"], True
+        response.raise_for_status()
+        data = response.json()
+        if data.get("code") == 200:
+            fingerprint = comic_fingerprint(data)
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+        logger.warning(f"【{path}】快速检查失败，改为获取章节列表: {e}")
+        return get_latest_chapter(path), False
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if marker and fingerprint and marker["fingerprint"] == fingerprint:
+        chapter_index.save_marker(path, etag, last_modified, fingerprint, marker["total"])
+        return marker["total"], True
+    total = get_latest_chapter(path)
+    if total and fingerprint:
+        chapter_index.save_marker(path, etag, last_modified, fingerprint, total)
+    return total, False
+
+def check_all_updates(comics):
+    """
+    并发检查所有漫画的最新章节数
+    :return: 与comics顺序一致的[(最新章节数, 是否跳过了章节列表请求)]
+    """
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, min(update_check_workers, len(comics)))) as executor:
+        results = list(executor.map(lambda comic: check_comic_update(comic["path"]), comics))
+    metrics.observe("update_check", time.monotonic() - started)
+    skipped = sum(1 for _, quick in results if quick)
+    logger.info(f"检查更新完成: 共{len(comics)}部漫画，{skipped}部未变化跳过章节列表请求，"
+                f"耗时 {time.monotonic() - started:.1f} 秒")
+    return results
+
+def plan_comic_updates(comics):
+    """
+    检查所有漫画的更新，生成下载计划（此时不下载任何章节）
+    :return: [{"idx": 漫画序号, "start": 起始章节, "end": 结束章节}]，仅包含有更新的漫画
+    """
+    plan = []
+    checked_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for idx, (comic, (total, _)) in enumerate(zip(comics, check_all_updates(comics))):
+        comic_name = comic["name"]
+        comic_last_chapter = comic["last_chapter"]
+        download_limit = comic["download_limit"]
+        logger.info(f"【{comic_name}】上次下载至第{comic_last_chapter}章")
+        if total <= comic_last_chapter:
+            logger.info(f"该漫画更新至{total}章，不需要更新")
+            comics[idx]["last_check_time"] = checked_at
+            state_store.update(comic["path"], last_check_time=checked_at)
+            continue
+        logger.info(f"【{comic_name}】检测到更新！最新：{total}章")
+        end = min(total, comic_last_chapter + download_limit)
+        logger.info(f"【{comic_name}】最大下载限制为{download_limit}章-需下载{comic_last_chapter + 1}~{end}章）")
+        plan.append({"idx": idx, "comic": comic, "start": comic_last_chapter + 1, "end": end})
+    state_store.flush()
+    return plan
+
+def estimate_chapter_bytes(chapter_info):
+    """
+    估算章节的下载字节数
+    章节列表中的size为图片张数，按plan_page_kb估算每张图片大小
+    """
+    pages = chapter_info.get("size") or 0
+    return int(pages) * plan_page_kb * 1024
+
+def apply_download_budget(plan):
+    """
+    按全局与每部漫画的字节预算裁剪下载计划（直接修改plan中的end）
+    各漫画轮流分配一个章节，避免配置靠前的漫画占满全部预算；
+    章节必须连续下载，某部漫画的下一章超出预算后不再为其分配；
+    每部漫画的第一个待下载章节总是分配(即使超出预算)，否则该漫画的进度永远不会前进
+    """
+    global_left = download_budget_mb * 1024 * 1024 if download_budget_mb else float("inf")
+    entries = []
+    for item in plan:
+        comic = item["comic"]
+        chapters = collect_chapters(comic["path"], item["start"], item["end"])
+        sizes = [estimate_chapter_bytes(info) for _, info in chapters]
+        budget_mb = comic.get("budget_mb") or 0
+        comic_left = budget_mb * 1024 * 1024 if budget_mb else float("inf")
+        entries.append({"item": item, "sizes": sizes, "left": comic_left, "count": 0, "bytes": 0})
+
+    active = list(entries)
+    while active:
+        for entry in list(active):
+            if entry["count"] >= len(entry["sizes"]):
+                active.remove(entry)
+                continue
+            size = entry["sizes"][entry["count"]]
+            if size > entry["left"] or size > global_left:
+                if entry["count"]:
+                    active.remove(entry)
+                    continue
+                logger.warning(f"【{entry['item']['comic']['name']}】第{entry['item']['start']}章"
+                               f"预计 {size / 1024 / 1024:.1f} MB，超出下载预算，仍下载该章以免进度停滞")
+            entry["count"] += 1
+            entry["bytes"] += size
+            entry["left"] -= size
+            global_left -= size
+
+    total_bytes = 0
+    total_chapters = 0
+    for entry in entries:
+        item = entry["item"]
+        planned = item["end"] - item["start"] + 1
+        item["end"] = item["start"] + entry["count"] - 1
+        total_bytes += entry["bytes"]
+        total_chapters += entry["count"]
+        skipped = f"，因预算跳过{planned - entry['count']}章" if entry["count"] < planned else ""
+        logger.info(f"【{item['comic']['name']}】计划下载{entry['count']}章，"
+                    f"预计 {entry['bytes'] / 1024 / 1024:.1f} MB{skipped}")
+    seconds = total_bytes / (plan_speed_mb * 1024 * 1024) if plan_speed_mb else 0
+    logger.info(f"下载计划: 共{total_chapters}章，预计 {total_bytes / 1024 / 1024:.1f} MB，"
+                f"预计耗时 {seconds / 60:.1f} 分钟")
+    return plan
 
 def check_and_download_comics():
-    """检查所有漫画更新，有更新则下载"""
+    """
+    检查所有漫画更新，有更新则下载
+    :return: 本次下载的漫画及章节结果[{"name", "path", "start", "end", "chapters": [{"index", "success"}]}]
+    """
     global pdf_switch  # 声明使用全局变量
     global pdf_password
     logger.info(f"===== 开始检查更新=====")
@@ -827,45 +3515,252 @@ def check_and_download_comics():
     config = load_config()
     global_config = config["global"]
     pdf_switch = global_config["pdf_switch"]
-    pdf_password = global_config["pdf_password"]
+    pdf_password = optional_setting(global_config["pdf_password"])
+    apply_global_config(global_config)
     comics = config["comics"]
     # 检测是否有有效漫画配置
     if not comics:
         logger.info("配置文件中未添加任何漫画，请修改 comic.yaml 后重新运行！")
-        return
+        return []
+
+    results = []
+    state_store.load(comics, STATE_SNAPSHOT_PATH)
+    plan = plan_comic_updates(comics)
+    if plan_switch == 1:
+        apply_download_budget(plan)
 
-    for idx, comic in enumerate(comics):
+    for item in plan:
+        idx = item["idx"]
+        comic = comics[idx]
         comic_name = comic["name"]
-        comic_path = comic["path"]
-        comic_last_chapter = comic["last_chapter"]
-        comic_last_check_time = comic["last_check_time"]
-        download_limit = comic["download_limit"]
-        logger.info(f"【{comic_name}】上次下载至第{comic_last_chapter}章")
-        total = get_latest_chapter(comic_path)
-        if total<= comic_last_chapter:
-            logger.info(f"该漫画更新至{total}章，不需要更新")
+        start, end = item["start"], item["end"]
+        if end < start:
+            logger.info(f"【{comic_name}】超出下载预算，本次跳过")
             comics[idx]["last_check_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            save_config(config)
+            state_store.update(comic["path"], last_check_time=comics[idx]["last_check_time"])
             continue
-        logger.info(f"【{comic_name}】检测到更新！最新：{total}章")
-        if comic_last_chapter + download_limit < total:
-            total = comic_last_chapter + download_limit
-        logger.info(f"【{comic_name}】最大下载限制为{download_limit}章-需下载{comic_last_chapter + 1}~{total}章）")
-        for chapter in range(comic_last_chapter + 1, total + 1):
-            if download_comic_image(chapter, chapter,comic_path):
-                comics[idx]["last_chapter"] = chapter
-                save_config(config)
-            else:
-                logger.info(f"【{comic_name}】第{chapter}章下载失败，终止后续章节下载")
-                break
+
+        def on_success(chapter):
+            comics[idx]["last_chapter"] = chapter
+            state_store.update(comics[idx]["path"], last_chapter=chapter)
+
+        started = time.monotonic()
+        report = download_comic_image(start, end, comic["path"], True, on_success, comic)
+        metrics.record_comic(comic_name, time.monotonic() - started, len(report),
+                             sum(1 for _, success in report if success))
+        results.append({"name": comic_name, "path": comic["path"], "start": start, "end": end,
+                        "chapters": [{"index": index, "success": success} for index, success in report]})
+        print_download_report(report)
+        if comics[idx]["last_chapter"] < end:
+            logger.info(f"【{comic_name}】第{comics[idx]['last_chapter'] + 1}章下载失败，终止后续章节下载")
         comics[idx]["last_check_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        save_config(config)
+        state_store.update(comic["path"], last_check_time=comics[idx]["last_check_time"])
+        state_store.flush()
+    state_store.export(STATE_SNAPSHOT_PATH)
+    state_store.close()
+    shutdown_output_executor()
+    close_download_engine()
+    hedge_policy.shutdown()
+    http_client.log_stats()
+    rate_limiter.log_stats()
+    api_cache.log_stats()
+    page_store.log_stats()
+    hedge_policy.log_stats()
+    logger.info(f"本次共下载图片 {downloaded_bytes.total / 1024 / 1024:.1f} MB")
+    if transcode_before_bytes.total:
+        logger.info(f"本次转码: {transcode_before_bytes.total / 1024 / 1024:.1f} MB -> "
+                    f"{transcode_after_bytes.total / 1024 / 1024:.1f} MB")
+    write_run_reports()
     logger.info(f"===== 检查更新完成 =====\n")
+    return results
+
+def write_run_reports():
+    """按设置输出本次运行的JSON报告和Prometheus textfile"""
+    if report_switch == 1:
+        metrics.write_report(os.path.join(REPORT_DIR, f'report_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.json'))
+    if metrics_textfile:
+        metrics.write_textfile(metrics_textfile)
+
+def print_json(data):
+    """命令行模式输出JSON（日志输出到stderr，stdout只有结果）"""
+    print(json.dumps(data, ensure_ascii=False, indent=2))
+
+def parse_chapter_range(value):
+    """解析章节范围 A-B 或单个章节 A"""
+    match = re.fullmatch(r"\s*(\d+)\s*(?:-\s*(\d+)\s*)?", str(value))
+    if not match:
+        raise argparse.ArgumentTypeError(f"章节范围格式错误: {value}，应为 起始-结束，如 1-10")
+    start = int(match.group(1))
+    end = int(match.group(2) or start)
+    if start < 1 or end < start:
+        raise argparse.ArgumentTypeError(f"章节范围无效: {value}")
+    return start, end
+
+def load_global_settings():
+    """命令行下载前读取comic.yaml的global配置（配置文件不存在时使用默认值）"""
+    global pdf_switch, pdf_password
+    if not os.path.exists(CONFIG_PATH):
+        return
+    global_config = load_config().get("global") or {}
+    pdf_switch = global_config.get("pdf_switch", pdf_switch)
+    pdf_password = optional_setting(global_config.get("pdf_password", pdf_password))
+    apply_global_config(global_config)
+
+def finish_downloads():
+    """等待输出转换完成并关闭下载引擎，输出统计信息"""
+    shutdown_output_executor()
+    close_download_engine()
+    hedge_policy.shutdown()
+    http_client.log_stats()
+    rate_limiter.log_stats()
+    api_cache.log_stats()
+    page_store.log_stats()
+    hedge_policy.log_stats()
+    write_run_reports()
+
+def run_download_job(job):
+    """
+    执行一个下载任务
+    :param job: {"path", "range": (起始, 结束)，以及可选的output_format/transcode}
+    :return: {"path", "start", "end", "chapters": [{"index", "success"}]}
+    """
+    start, end = job["range"]
+    report = download_comic_image(start, end, job["path"], comic_config=job)
+    print_download_report(report)
+    return {"path": job["path"], "start": start, "end": end,
+            "chapters": [{"index": index, "success": success} for index, success in report]}
+
+def load_batch_jobs(job_file):
+    """
+    读取批量任务文件(YAML或JSON)：
+    jobs:
+    - path: haizeiwang
+      range: 1-10
+      output_format: cbz #可选
+    """
+    import yaml
+    with open(job_file, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or []
+    jobs = data.get("jobs", []) if isinstance(data, dict) else data
+    for job in jobs:
+        job["range"] = parse_chapter_range(job["range"])
+    return jobs
+
+def cli_search(args):
+    results = search_copy_manga(args.keyword, args.page)
+    print_json(results)
+    return 0 if results and results.get("code") == 200 else 1
+
+def cli_info(args):
+    results = get_comic(args.path)
+    print_json(results)
+    return 0 if results and results.get("code") == 200 else 1
+
+def cli_chapters(args):
+    if not args.all:
+        results = get_chapters(args.path, args.page)
+        print_json(results)
+        return 0 if results and results.get("code") == 200 else 1
+    total = get_latest_chapter(args.path)
+    chapters = collect_chapters(args.path, 1, total) if total else []
+    print_json({"path": args.path, "total": total,
+                "chapters": [dict(info, index=index) for index, info in chapters]})
+    return 0 if total else 1
+
+def cli_download(args):
+    load_global_settings()
+    job = {"path": args.path, "range": args.range}
+    if args.format:
+        job["output_format"] = args.format
+    result = run_download_job(job)
+    finish_downloads()
+    result["outputs"] = list(run_outputs)
+    print_json(result)
+    return 0 if result["chapters"] and all(item["success"] for item in result["chapters"]) else 1
+
+def cli_batch(args):
+    """并发执行多个下载任务，共用下载调度器、限速器和输出进程池"""
+    load_global_settings()
+    jobs = load_batch_jobs(args.job_file)
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        results = list(executor.map(run_download_job, jobs))
+    finish_downloads()
+    print_json({"jobs": results, "outputs": list(run_outputs)})
+    return 0 if all(item["chapters"] and all(chapter["success"] for chapter in item["chapters"])
+                    for item in results) else 1
+
+def cli_check(args):
+    results = check_and_download_comics()
+    print_json({"comics": results, "outputs": list(run_outputs)})
+    return 0 if all(chapter["success"] for item in results for chapter in item["chapters"]) else 1
+
+def cli_pack(args):
+    if os.path.exists(CONFIG_PATH):
+        apply_global_config(load_config().get("global") or {})
+    max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb else None
+    print_json(pack_outputs(scan_out_dir(), max_bytes=max_bytes))
+    return 0
+
+def cli_export_state(args):
+    state_store.export(args.output)
+    state_store.close()
+    return 0
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="app.py", description="mkk_comic 命令行模式（不带参数运行进入交互菜单）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sub = subparsers.add_parser("search", help="搜索漫画")
+    sub.add_argument("keyword")
+    sub.add_argument("--page", type=int, default=1)
+    sub.set_defaults(func=cli_search)
+
+    sub = subparsers.add_parser("info", help="查看漫画详情")
+    sub.add_argument("path")
+    sub.set_defaults(func=cli_info)
+
+    sub = subparsers.add_parser("chapters", help="查看章节列表")
+    sub.add_argument("path")
+    sub.add_argument("--page", type=int, default=1, help=f"章节列表页码，每页{CHAPTER_PAGE_LIMIT}章")
+    sub.add_argument("--all", action="store_true", help="输出全部章节")
+    sub.set_defaults(func=cli_chapters)
+
+    sub = subparsers.add_parser("download", help="下载指定范围的章节")
+    sub.add_argument("--path", required=True)
+    sub.add_argument("--range", required=True, type=parse_chapter_range, help="章节范围，如 1-10")
+    sub.add_argument("--format", choices=sorted(OUTPUT_WRITERS) + ["none"], help="输出格式，默认使用配置文件")
+    sub.set_defaults(func=cli_download)
+
+    sub = subparsers.add_parser("batch", help="并发执行任务文件中的多个下载任务")
+    sub.add_argument("job_file")
+    sub.add_argument("--jobs", type=int, default=4, help="同时执行的任务数")
+    sub.set_defaults(func=cli_batch)
+
+    sub = subparsers.add_parser("check", help="检查comic.yaml中所有漫画的更新并下载")
+    sub.set_defaults(func=cli_check)
+
+    sub = subparsers.add_parser("pack", help="将下载结果按大小上限分卷打包")
+    sub.add_argument("--max-mb", type=float, help="单个压缩包大小上限MB，默认使用pack_max_mb")
+    sub.set_defaults(func=cli_pack)
+
+    sub = subparsers.add_parser("export-state", help="导出订阅状态快照")
+    sub.add_argument("output", nargs="?", default=STATE_SNAPSHOT_PATH)
+    sub.set_defaults(func=cli_export_state)
+    return parser
+
+def run_cli(argv):
+    args = build_arg_parser().parse_args(argv)
+    return args.func(args)
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # 打包为exe时进程池需要
     logger = setup_rotating_logger()
-    if is_running_in_github_actions():
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    elif is_running_in_github_actions():
         logger.info("运行环境：GitHub Actions（自动化模式）")
         check_and_download_comics()
+        pack_outputs()
     else:
         window_main()
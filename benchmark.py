@@ -0,0 +1,402 @@
+"""
+离线基准测试：启动本地模拟的漫画API与图片服务器，端到端测量下载与PDF生成性能
+不访问真实网站，可配置延迟、错误率、限流比例与图片大小
+
+用法:
+    python benchmark.py                          # 默认参数
+    python benchmark.py --latency 50 --error-rate 0.02 --throttle-rate 0.05 --image-kb 400
+    python benchmark.py --json bench.json        # 同时保存JSON结果
+    python benchmark.py --stall-rate 0.03 --hedge # 少量图片响应极慢时开启对冲请求
+    python benchmark.py --startup                # 启动性能：导入耗时与"无更新"运行的CPU时间是否在预算内
+"""
+import argparse
+import io
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+def make_image(target_kb, seed):
+    """生成约target_kb大小的JPEG图片（随机噪声，避免被压缩得过小）"""
+    from PIL import Image
+    rng = random.Random(seed)
+    width = 800
+    # 随机噪声JPEG(质量85)每像素约1.3字节，按目标大小估算高度
+    height = max(64, int(target_kb * 1024 / 1.3 / width))
+    data = rng.randbytes(width * height * 3)
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (width, height), data).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class MockState:
+    """模拟服务器的配置与请求统计"""
+
+    def __init__(self, args):
+        self.comics = args.comics
+        self.chapters = args.chapters
+        self.pages = args.pages
+        self.api_latency = args.api_latency / 1000
+        self.latency = args.latency / 1000
+        self.jitter = args.jitter / 1000
+        self.error_rate = args.error_rate
+        self.throttle_rate = args.throttle_rate
+        self.stall_rate = args.stall_rate
+        self.stall = args.stall_ms / 1000
+        self.images = [make_image(args.image_kb, seed) for seed in range(args.image_pool)]
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def count(self, key):
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """模拟CopyManga接口(/api/v3/...)和图片CDN(/img/...)"""
+    protocol_version = "HTTP/1.1"
+    state = None
+    image_base = None
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, code, body=b"", content_type="application/json", headers=None):
+        if isinstance(body, dict):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def delay(self, base):
+        if base or self.state.jitter:
+            time.sleep(base + random.random() * self.state.jitter)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+        state = self.state
+
+        if match := re.match(r"/img/(\w+)/(\d+)/(\d+)\.jpg$", path):
+            state.count("image")
+            self.delay(state.latency)
+            if random.random() < state.stall_rate:
+                state.count("image_stall")
+                time.sleep(state.stall)
+            roll = random.random()
+            if roll < state.throttle_rate:
+                state.count("image_429")
+                return self.send(429, headers={"Retry-After": "1"})
+            if roll < state.throttle_rate + state.error_rate:
+                state.count("image_500")
+                return self.send(500)
+            image = state.images[(int(match[2]) * state.pages + int(match[3])) % len(state.images)]
+            return self.send(200, image, "image/jpeg")
+
+        self.delay(state.api_latency)
+        if path == "/api/v3/search/comic":
+            state.count("search")
+            comics = [{"name": f"测试漫画{i}", "path_word": f"bench{i}", "author": [], "alias": "", "cover": ""}
+                      for i in range(state.comics)]
+            return self.send(200, {"code": 200, "results": {"total": len(comics), "limit": 5, "offset": 0, "list": comics[:5]}})
+        if match := re.match(r"/api/v3/comic2/(\w+)$", path):
+            state.count("comic2")
+            return self.send(200, {"code": 200, "results": {"comic": {
+                "name": f"测试漫画{match[1]}", "path_word": match[1], "datetime_updated": "2026-01-01",
+                "last_chapter": {"name": f"第{state.chapters}话", "uuid": f"{match[1]}-{state.chapters}"}}}})
+        if match := re.match(r"/api/v3/comic/(\w+)/group/default/chapters$", path):
+            state.count("chapters")
+            limit = int(query.get("limit", ["50"])[0])
+            offset = int(query.get("offset", ["0"])[0])
+            chapters = [{"name": f"第{i}话", "uuid": f"{match[1]}-{i}", "size": state.pages, "datetime_created": "2026-01-01"}
+                        for i in range(offset + 1, min(offset + limit, state.chapters) + 1)]
+            return self.send(200, {"code": 200, "results": {"total": state.chapters, "limit": limit, "offset": offset, "list": chapters}})
+        if match := re.match(r"/api/v3/comic/(\w+)/chapter2/(\w+)-(\d+)$", path):
+            state.count("chapter2")
+            comic, index = match[2], int(match[3])
+            contents = [{"url": f"{self.image_base}/img/{comic}/{index}/{page}.jpg"} for page in range(state.pages)]
+            return self.send(200, {"code": 200, "results": {
+                "comic": {"name": f"测试漫画{comic}", "path_word": comic},
+                "chapter": {"name": f"第{index}话", "uuid": f"{comic}-{index}", "contents": contents,
+                            "words": list(range(state.pages))}}})
+        return self.send(404)
+
+
+def start_server(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def page_stats(app, seconds):
+    """根据app的运行统计计算图片下载指标"""
+    summary = app.metrics.summary()
+    page = summary["spans"].get("page", {"count": 0, "p50": 0, "p99": 0})
+    output = summary["spans"].get("output.pdf", {"count": 0, "sum": 0})
+    return {
+        "seconds": round(seconds, 3),
+        "pages": page["count"],
+        "pages_per_s": round(page["count"] / seconds, 2) if seconds else 0,
+        "mb_per_s": round(app.downloaded_bytes.total / 1024 / 1024 / seconds, 2) if seconds else 0,
+        "page_p50_ms": round(page["p50"] * 1000, 1),
+        "page_p99_ms": round(page["p99"] * 1000, 1),
+        "pdf_s_per_chapter": round(output["sum"] / output["count"], 3) if output["count"] else None,
+        "retries": summary["counters"].get("page_retries", {}),
+        "failures": summary["counters"].get("page_failures", {}),
+        "hedges": summary["counters"].get("page_hedges", {}),
+    }
+
+
+def reset_stats(app):
+    app.metrics = app.RunMetrics()
+    app.downloaded_bytes = app.ByteCounter()
+
+
+def bench_images(app, state, args):
+    """只测图片下载：直接提交章节图片到下载器"""
+    reset_stats(app)
+    started = time.perf_counter()
+    futures = []
+    for index in range(1, args.chapters + 1):
+        meta = app.fetch_chapter_meta("bench0", index, {"uuid": f"bench0-{index}", "name": f"第{index}话"})
+        futures.append(app.submit_chapter_images(meta["contents"], meta["words"], meta["output_dir"]))
+    for future in futures:
+        future.result()
+    return page_stats(app, time.perf_counter() - started)
+
+
+def bench_check_and_download(app, state, args):
+    """端到端：检查所有漫画更新并下载、生成PDF"""
+    import yaml
+    reset_stats(app)
+    config = {
+        "global": {
+            "pdf_switch": 1,
+            "pdf_password": None,
+            "download_workers": args.workers,
+            "download_engine": args.engine,
+            "rate_limit_initial": args.rate,
+            "rate_limit_max": max(args.rate, 50),
+            "report_switch": 0,
+            "hedge_switch": 1 if args.hedge else 0,
+        },
+        "comics": [{"name": f"测试漫画{i}", "path": f"bench{i}", "last_chapter": 0, "download_limit": args.chapters}
+                   for i in range(args.comics)],
+    }
+    os.makedirs("./config", exist_ok=True)
+    with open(app.CONFIG_PATH, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+    started = time.perf_counter()
+    app.check_and_download_comics()
+    return page_stats(app, time.perf_counter() - started)
+
+
+def print_result(name, result):
+    print(f"\n[{name}]")
+    print(f"  耗时: {result['seconds']} 秒，图片: {result['pages']} 张")
+    print(f"  吞吐: {result['pages_per_s']} 张/秒，{result['mb_per_s']} MB/秒")
+    print(f"  单页耗时: p50 {result['page_p50_ms']} ms，p99 {result['page_p99_ms']} ms")
+    if result["pdf_s_per_chapter"] is not None:
+        print(f"  PDF生成: {result['pdf_s_per_chapter']} 秒/章")
+    if result["retries"] or result["failures"]:
+        print(f"  重试: {result['retries']}  失败: {result['failures']}")
+    if result["hedges"]:
+        print(f"  对冲请求: 发起 {result['hedges'].get('fired', 0)} 次，胜出 {result['hedges'].get('won', 0)} 次")
+
+
+# 启动时不应导入的重型依赖（只在生成PDF/转码时导入）
+LAZY_MODULES = ("PIL", "reportlab")
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_importtime(stderr):
+    """解析-X importtime输出，返回({模块: 累计微秒}, app累计微秒)"""
+    modules = {}
+    for line in stderr.splitlines():
+        if match := re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$", line):
+            modules[match[4]] = int(match[2])
+    return modules, modules.get("app")
+
+
+def bench_import_time(repeat):
+    """多次冷启动导入app，取最小值"""
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                                   cwd=APP_DIR, capture_output=True, text=True)
+        modules, app_us = parse_importtime(completed.stderr)
+        if app_us is not None and (best is None or app_us < best[1]):
+            best = (modules, app_us)
+    modules, app_us = best
+    return {
+        "import_ms": round(app_us / 1000, 1),
+        "lazy_loaded": [name for name in LAZY_MODULES if name in modules],
+        "top_modules_ms": {name: round(us / 1000, 1) for name, us in
+                           sorted(((name, us) for name, us in modules.items() if "." not in name),
+                                  key=lambda item: -item[1])[:8]},
+    }
+
+
+def bench_noop_check(args):
+    """
+    所有漫画都已是最新时运行 app.py check，统计子进程CPU时间
+    第一次运行建立章节索引与更新标记，统计第二次运行
+    """
+    import yaml
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    workdir = tempfile.mkdtemp(prefix="mkk_noop_")
+    try:
+        os.makedirs(os.path.join(workdir, "config"))
+        config = {
+            "global": {"pdf_switch": 0, "pdf_password": None, "report_switch": 0},
+            "comics": [{"name": f"测试漫画{i}", "path": f"bench{i}", "last_chapter": args.chapters, "download_limit": 5}
+                       for i in range(args.comics)],
+        }
+        with open(os.path.join(workdir, "config", "comic.yaml"), "w", encoding="utf-8") as f:
+            yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+        command = [sys.executable, "-X", "importtime", os.path.join(APP_DIR, "app.py"), "check"]
+        subprocess.run(command, cwd=workdir, capture_output=True)
+        before = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=workdir, capture_output=True, text=True)
+        wall = time.perf_counter() - started
+        if resource:
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+        else:
+            cpu = None
+        modules, _ = parse_importtime(completed.stderr)
+        return {
+            "returncode": completed.returncode,
+            "wall_s": round(wall, 3),
+            "cpu_s": round(cpu, 3) if cpu is not None else None,
+            "lazy_loaded": [name for name in LAZY_MODULES if name in modules],
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_startup(args):
+    """启动性能检查，超出预算时返回非0"""
+    results = {"import": bench_import_time(args.repeat), "noop_check": bench_noop_check(args)}
+    imported, noop = results["import"], results["noop_check"]
+    print("\n[导入耗时]")
+    print(f"  import app: {imported['import_ms']} ms (预算 {args.import_budget_ms} ms)")
+    print(f"  主要模块: {imported['top_modules_ms']}")
+    print("\n[无更新运行 app.py check]")
+    print(f"  CPU: {noop['cpu_s']} 秒 (预算 {args.noop_cpu_budget} 秒)，耗时: {noop['wall_s']} 秒，退出码: {noop['returncode']}")
+    failures = []
+    if imported["import_ms"] > args.import_budget_ms:
+        failures.append("导入耗时超出预算")
+    if imported["lazy_loaded"] or noop["lazy_loaded"]:
+        failures.append(f"启动时导入了应延迟加载的模块: {sorted(set(imported['lazy_loaded'] + noop['lazy_loaded']))}")
+    if noop["cpu_s"] is not None and noop["cpu_s"] > args.noop_cpu_budget:
+        failures.append("无更新运行CPU时间超出预算")
+    if noop["returncode"] != 0:
+        failures.append("无更新运行失败")
+    for failure in failures:
+        print(f"✗ {failure}")
+    results["passed"] = not failures
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="mkk_comic 离线基准测试")
+    parser.add_argument("--comics", type=int, default=3, help="模拟的漫画数量")
+    parser.add_argument("--chapters", type=int, default=5, help="每部漫画的章节数")
+    parser.add_argument("--pages", type=int, default=20, help="每章图片数")
+    parser.add_argument("--image-kb", type=int, default=200, help="每张图片大小(KB)")
+    parser.add_argument("--image-pool", type=int, default=16, help="不同图片的数量")
+    parser.add_argument("--latency", type=float, default=30, help="图片请求延迟(毫秒)")
+    parser.add_argument("--api-latency", type=float, default=50, help="API请求延迟(毫秒)")
+    parser.add_argument("--jitter", type=float, default=20, help="随机附加延迟上限(毫秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="图片请求返回500的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="图片请求返回429的比例")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="图片请求响应极慢的比例(模拟CDN长尾)")
+    parser.add_argument("--stall-ms", type=float, default=3000, help="极慢响应的附加延迟(毫秒)")
+    parser.add_argument("--hedge", action="store_true", help="开启对冲请求(hedge_switch)")
+    parser.add_argument("--workers", type=int, default=5, help="下载线程数(download_workers)")
+    parser.add_argument("--engine", default="thread", choices=["thread", "async"], help="下载引擎")
+    parser.add_argument("--rate", type=float, default=50, help="每个域名初始请求速率(次/秒)")
+    parser.add_argument("--json", help="保存JSON结果的路径")
+    parser.add_argument("--startup", action="store_true", help="只测试启动性能(导入耗时与无更新运行的CPU时间)")
+    parser.add_argument("--import-budget-ms", type=float, default=300, help="import app耗时预算(毫秒)")
+    parser.add_argument("--noop-cpu-budget", type=float, default=1.0, help="无更新运行的CPU时间预算(秒)")
+    parser.add_argument("--repeat", type=int, default=5, help="导入耗时测试次数(取最小值)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    state = MockState(args)
+    MockHandler.state = state
+    api_server = start_server(MockHandler)
+    # 图片使用单独的端口，模拟API与CDN为不同域名
+    cdn_server = start_server(MockHandler)
+    MockHandler.image_base = f"http://127.0.0.1:{cdn_server.server_address[1]}"
+    os.environ["MKK_API_SCHEME"] = "http"
+    os.environ["MKK_API_ADDER"] = f"127.0.0.1:{api_server.server_address[1]}"
+
+    if args.startup:
+        try:
+            results = run_startup(args)
+        finally:
+            api_server.shutdown()
+            cdn_server.shutdown()
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        sys.exit(0 if results["passed"] else 1)
+
+    workdir = tempfile.mkdtemp(prefix="mkk_bench_")
+    cwd = os.getcwd()
+    sys.path.insert(0, APP_DIR)
+    os.chdir(workdir)
+    try:
+        import app
+        app.download_workers = args.workers
+        app.download_engine = args.engine
+        app.http_client.configure(args.workers * 2 if args.hedge else args.workers)
+        app.hedge_policy.configure(args.hedge)
+        app.page_scheduler.configure(args.workers)
+        app.rate_limiter.configure(args.rate, 1, max(args.rate, 50))
+
+        results = {"params": vars(args)}
+        results["images"] = bench_images(app, state, args)
+        print_result("图片下载", results["images"])
+        shutil.rmtree("./out", ignore_errors=True)
+        results["check_and_download"] = bench_check_and_download(app, state, args)
+        print_result("检查更新并下载(含PDF)", results["check_and_download"])
+        results["server_requests"] = dict(state.requests)
+        print(f"\n模拟服务器请求统计: {state.requests}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        api_server.shutdown()
+        cdn_server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
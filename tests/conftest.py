@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_workdir(tmp_path, monkeypatch):
+    """在临时目录中运行测试，避免在仓库的logs/config/out等目录中留下文件"""
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
@@ -0,0 +1,90 @@
+import json
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.content = json.dumps(data).encode("utf-8")
+        self._data = data
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ApiCacheTest(unittest.TestCase):
+    """API响应缓存：按接口设置有效期，超过大小上限时淘汰最久未使用的响应"""
+
+    def setUp(self):
+        self.cache = app.ApiCache(os.path.join("cache", "api_cache.db"), 1024 * 1024, {"comic2": 300, "search": 0})
+        self.fetched = []
+        patcher = mock.patch.object(app.ApiCache, "_fetch", side_effect=self.fetch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, endpoint, url, params):
+        self.fetched.append(self.cache.make_key(url, params))
+        return FakeResponse({"code": 200, "results": {"url": url, "n": len(self.fetched), "pad": "x" * 300}})
+
+    def test_hit_within_ttl(self):
+        first = self.cache.get("comic2", "http://api/a", {"platform": 1})
+        second = self.cache.get("comic2", "http://api/a", {"platform": 1})
+        self.assertEqual(first, second)
+        self.assertEqual(self.fetched, ["http://api/a?platform=1"])
+        self.assertEqual(self.cache._stats["comic2"], {"hits": 1, "misses": 1, "evictions": 0})
+
+    def test_expired(self):
+        self.cache.get("comic2", "http://api/a")
+        later = time.time() + 301
+        with mock.patch.object(app.time, "time", return_value=later):
+            self.assertEqual(self.cache.get("comic2", "http://api/a")["results"]["n"], 2)
+
+    def test_refresh_and_no_ttl(self):
+        self.cache.get("comic2", "http://api/a")
+        self.assertEqual(self.cache.get("comic2", "http://api/a", refresh=True)["results"]["n"], 2)
+        self.cache.get("search", "http://api/s")
+        self.cache.get("search", "http://api/s")
+        self.assertEqual(len(self.fetched), 4)
+
+    def test_skip_failed_response(self):
+        with mock.patch.object(app.ApiCache, "_fetch", return_value=FakeResponse({"code": 404})):
+            self.cache.get("comic2", "http://api/a")
+        self.cache.get("comic2", "http://api/a")
+        self.assertEqual(self.fetched, ["http://api/a"])
+
+    def test_lru_eviction(self):
+        self.cache.configure(max_bytes=1000)
+        self.cache.get("comic2", "http://api/a")
+        time.sleep(0.01)
+        self.cache.get("comic2", "http://api/b")
+        time.sleep(0.01)
+        self.cache.get("comic2", "http://api/a")  # a 最近使用
+        time.sleep(0.01)
+        self.cache.get("comic2", "http://api/c")  # 超出上限，淘汰b
+        self.assertEqual(self.cache._stats["comic2"]["evictions"], 1)
+        self.cache.get("comic2", "http://api/a")
+        self.cache.get("comic2", "http://api/b")
+        self.assertEqual(self.fetched, ["http://api/a", "http://api/b", "http://api/c", "http://api/b"])
+
+    def test_disabled(self):
+        self.cache.configure(enabled=False)
+        self.cache.get("comic2", "http://api/a")
+        self.cache.get("comic2", "http://api/a")
+        self.assertEqual(len(self.fetched), 2)
+
+    def test_invalidate(self):
+        self.cache.get("comic2", "http://api/a")
+        self.cache.invalidate("comic2", "http://api/a")
+        self.cache.get("comic2", "http://api/a")
+        self.assertEqual(len(self.fetched), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmark.py")
+
+
+class BenchmarkTest(unittest.TestCase):
+    """离线基准测试：本地模拟API与图片服务器，端到端运行下载和PDF生成"""
+
+    def run_benchmark(self, *args):
+        result = subprocess.run(
+            [sys.executable, BENCHMARK, "--comics", "1", "--chapters", "2", "--pages", "3", "--image-kb", "20",
+             "--image-pool", "2", "--latency", "0", "--api-latency", "0", "--jitter", "0", "--json", "result.json", *args],
+            capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        with open("result.json", encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_offline_run(self):
+        results = self.run_benchmark()
+        self.assertEqual(results["images"]["pages"], 6)
+        self.assertEqual(results["check_and_download"]["pages"], 6)
+        self.assertIsNotNone(results["check_and_download"]["pdf_s_per_chapter"])
+        self.assertEqual(results["server_requests"]["image"], 12)
+        self.assertEqual(results["check_and_download"]["failures"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import io
+import os
+import sys
+import unittest
+import zipfile
+from xml.etree import ElementTree
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+OPF = "{http://www.idpf.org/2007/opf}"
+
+
+class CbzEpubTest(unittest.TestCase):
+    """CBZ/EPUB输出：图片原样存储，按真实格式命名"""
+
+    def setUp(self):
+        self.chapter = os.path.join("comic", "第1话")
+        os.makedirs(self.chapter)
+        self.pages = []
+        for i, (image_format, size) in enumerate([("JPEG", (300, 500)), ("PNG", (400, 200))], start=1):
+            buffer = io.BytesIO()
+            Image.new("RGB", size, "red").save(buffer, image_format)
+            with open(os.path.join(self.chapter, f"{i:03d}.jpg"), "wb") as f:
+                f.write(buffer.getvalue())
+            self.pages.append(buffer.getvalue())
+
+    def test_cbz(self):
+        output = app.make_cbz(self.chapter, 3)
+        self.assertEqual(output, os.path.abspath(self.chapter + ".cbz"))
+        with zipfile.ZipFile(output) as zf:
+            self.assertEqual(zf.namelist(), ["001.jpg", "002.png"])
+            self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist()))
+            self.assertEqual([zf.read(name) for name in zf.namelist()], self.pages)
+        self.assertFalse(os.path.exists(output + ".part"))
+
+    def test_epub(self):
+        output = app.make_epub(self.chapter, 2)
+        self.assertEqual(output, os.path.abspath(self.chapter + ".epub"))
+        with zipfile.ZipFile(output) as zf:
+            first = zf.infolist()[0]
+            self.assertEqual(first.filename, "mimetype")
+            self.assertEqual(first.compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zf.read("mimetype"), b"application/epub+zip")
+            self.assertEqual(zf.read("OEBPS/images/002.png"), self.pages[1])
+
+            opf = ElementTree.fromstring(zf.read("OEBPS/content.opf"))
+            self.assertEqual(len(opf.findall(f"{OPF}spine/{OPF}itemref")), 2)
+            media_types = {item.get("href"): item.get("media-type") for item in opf.iter(f"{OPF}item")}
+            self.assertEqual(media_types["images/001.jpg"], "image/jpeg")
+            self.assertEqual(media_types["images/002.png"], "image/png")
+            for name in ("OEBPS/nav.xhtml", "OEBPS/page001.xhtml", "OEBPS/page002.xhtml"):
+                ElementTree.fromstring(zf.read(name))
+            self.assertIn(b"width=400, height=200", zf.read("OEBPS/page002.xhtml"))
+
+    def test_empty_chapter(self):
+        os.makedirs("empty")
+        self.assertIsNone(app.make_cbz("empty", 2))
+        self.assertIsNone(app.make_epub("empty", 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
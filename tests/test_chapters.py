@@ -0,0 +1,88 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+def fake_chapters(total, prefix="u"):
+    """模拟章节列表接口：共total章，按CHAPTER_PAGE_LIMIT分页"""
+    calls = []
+
+    def get_chapters(path, page_num=1, refresh=False):
+        calls.append(page_num)
+        offset = (page_num - 1) * app.CHAPTER_PAGE_LIMIT
+        count = max(min(app.CHAPTER_PAGE_LIMIT, total - offset), 0)
+        chapters = [{"uuid": f"{prefix}{offset + i + 1}", "name": f"第{offset + i + 1}话", "size": 10}
+                    for i in range(count)]
+        return {"code": 200, "results": {"total": total, "offset": offset, "list": chapters}}
+
+    return get_chapters, calls
+
+
+class FetchChaptersTest(unittest.TestCase):
+    """范围下载：每个章节列表页只请求一次"""
+
+    def test_each_page_once(self):
+        get_chapters, calls = fake_chapters(120)
+        with mock.patch.object(app, "get_chapters", get_chapters):
+            chapters = app.fetch_chapters_from_api("comic", 45, 105)
+        self.assertEqual(calls, [1, 2, 3])
+        self.assertEqual([index for index, _ in chapters], list(range(45, 106)))
+        self.assertEqual(chapters[0][1]["uuid"], "u45")
+
+    def test_stop_on_failed_page(self):
+        get_chapters, calls = fake_chapters(120)
+
+        def failing(path, page_num=1, refresh=False):
+            return get_chapters(path, page_num) if page_num == 1 else {"code": 500, "message": "error"}
+
+        with mock.patch.object(app, "get_chapters", failing):
+            chapters = app.fetch_chapters_from_api("comic", 45, 105)
+        self.assertEqual([index for index, _ in chapters], list(range(45, 51)))
+
+
+class ChapterIndexTest(unittest.TestCase):
+    """本地章节索引：首次完整同步，之后只请求本地最后一章所在页及之后的页"""
+
+    def setUp(self):
+        self.index = app.ChapterIndex(os.path.join("cache", "chapter_index.db"))
+
+    def sync(self, get_chapters):
+        with mock.patch.object(app, "get_chapters", get_chapters):
+            return self.index.sync("comic")
+
+    def test_incremental_sync(self):
+        get_chapters, calls = fake_chapters(60)
+        self.assertEqual(self.sync(get_chapters), 60)
+        self.assertEqual(calls, [1, 2])
+
+        get_chapters, calls = fake_chapters(130)
+        self.assertEqual(self.sync(get_chapters), 130)
+        self.assertEqual(calls, [2, 3])
+        self.assertEqual(self.index.known_count("comic"), 130)
+        self.assertEqual([index for index, _ in self.index.get_range("comic", 59, 61)], [59, 60, 61])
+
+    def test_rebuild_when_changed(self):
+        get_chapters, _ = fake_chapters(60)
+        self.sync(get_chapters)
+
+        get_chapters, calls = fake_chapters(60, prefix="v")
+        self.assertEqual(self.sync(get_chapters), 60)
+        self.assertEqual(calls, [2, 1, 2])
+        self.assertEqual(self.index.get_range("comic", 1, 1)[0][1]["uuid"], "v1")
+
+    def test_collect_chapters_uses_index(self):
+        get_chapters, calls = fake_chapters(60)
+        with mock.patch.object(app, "chapter_index", self.index), \
+                mock.patch.object(app, "get_chapters", get_chapters):
+            self.assertEqual(len(app.collect_chapters("comic", 1, 60)), 60)
+            self.assertEqual(len(app.collect_chapters("comic", 10, 20)), 11)
+        self.assertEqual(calls, [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+def run_cli(*argv):
+    """运行命令行并解析stdout中的JSON结果"""
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        code = app.run_cli(list(argv))
+    return code, json.loads(stdout.getvalue())
+
+
+def fake_job(job):
+    start, end = job["range"]
+    return {"path": job["path"], "start": start, "end": end,
+            "chapters": [{"index": index, "success": job["path"] != "bad"} for index in range(start, end + 1)]}
+
+
+class ChapterRangeTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(app.parse_chapter_range("1-10"), (1, 10))
+        self.assertEqual(app.parse_chapter_range(" 3 - 4 "), (3, 4))
+        self.assertEqual(app.parse_chapter_range(5), (5, 5))
+        for value in ("0-3", "5-2", "a-b", "1-"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                app.parse_chapter_range(value)
+
+
+class CliTest(unittest.TestCase):
+    """命令行模式：结果以JSON输出到stdout，失败时返回非0"""
+
+    def setUp(self):
+        patchers = [
+            mock.patch.object(app, "run_download_job", side_effect=fake_job),
+            mock.patch.object(app, "finish_downloads"),
+            mock.patch.object(app, "run_outputs", []),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_download(self):
+        code, result = run_cli("download", "--path", "comic", "--range", "2-3", "--format", "cbz")
+        self.assertEqual(code, 0)
+        self.assertEqual([item["index"] for item in result["chapters"]], [2, 3])
+        self.assertEqual(app.run_download_job.call_args[0][0]["output_format"], "cbz")
+        app.finish_downloads.assert_called_once()
+
+    def test_download_failed(self):
+        code, _ = run_cli("download", "--path", "bad", "--range", "1")
+        self.assertEqual(code, 1)
+
+    def test_invalid_arguments(self):
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit) as ctx:
+            app.run_cli(["download", "--path", "comic", "--range", "3-1"])
+        self.assertEqual(ctx.exception.code, 2)
+
+    def test_batch(self):
+        with open("jobs.yaml", "w", encoding="utf-8") as f:
+            f.write("jobs:\n- path: a\n  range: 1-2\n- path: b\n  range: 5\n  output_format: epub\n")
+        code, result = run_cli("batch", "jobs.yaml", "--jobs", "2")
+        self.assertEqual(code, 0)
+        self.assertEqual([(job["path"], job["start"], job["end"]) for job in result["jobs"]], [("a", 1, 2), ("b", 5, 5)])
+        app.finish_downloads.assert_called_once()
+
+    def test_batch_failed(self):
+        with open("jobs.json", "w", encoding="utf-8") as f:
+            json.dump([{"path": "a", "range": "1"}, {"path": "bad", "range": "1"}], f)
+        code, _ = run_cli("batch", "jobs.json")
+        self.assertEqual(code, 1)
+
+    def test_pack(self):
+        os.makedirs(os.path.join("out", "A"))
+        with open(os.path.join("out", "A", "第1话.pdf"), "wb") as f:
+            f.write(b"x" * 100)
+        code, manifest = run_cli("pack", "--max-mb", "1")
+        self.assertEqual(code, 0)
+        self.assertEqual(manifest["max_bytes"], 1024 * 1024)
+        self.assertEqual(manifest["parts"][0]["chapters"], [{"comic": "A", "chapter": "第1话.pdf"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
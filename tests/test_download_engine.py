@@ -0,0 +1,130 @@
+import asyncio
+import builtins
+import io
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+try:
+    import aiohttp  # noqa: F401
+except ImportError:
+    aiohttp = None
+
+
+class DownloadEngineConfigTest(unittest.TestCase):
+    """aiohttp为可选依赖：只有配置async引擎时才要求安装"""
+
+    def setUp(self):
+        self.engine = app.download_engine
+        self.addCleanup(setattr, app, "download_engine", self.engine)
+
+    def block_aiohttp(self):
+        real_import = builtins.__import__
+
+        def fake_import(name, *args, **kwargs):
+            if name == "aiohttp":
+                raise ImportError(name)
+            return real_import(name, *args, **kwargs)
+
+        return mock.patch.object(builtins, "__import__", side_effect=fake_import)
+
+    def test_async_without_aiohttp_exits(self):
+        with self.block_aiohttp(), self.assertRaises(SystemExit) as ctx:
+            app.apply_global_config({"download_engine": "async"})
+        self.assertIn("aiohttp", str(ctx.exception))
+
+    def test_thread_without_aiohttp(self):
+        with self.block_aiohttp():
+            app.apply_global_config({"download_engine": "thread"})
+        self.assertEqual(app.download_engine, "thread")
+
+
+def make_jpeg(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """按路径返回图片，/missing 返回404"""
+    images = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = self.images.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ByteBudgetTest(unittest.TestCase):
+    """字节预算：未写盘数据超过上限时阻塞新的读取"""
+
+    def test_backpressure(self):
+        async def scenario():
+            budget = app.ByteBudget(100)
+            await budget.acquire(60)
+            second = asyncio.ensure_future(budget.acquire(60))
+            await asyncio.sleep(0.05)
+            self.assertFalse(second.done())
+            await budget.release(60)
+            await asyncio.wait_for(second, 1)
+            self.assertEqual(budget.in_flight, 60)
+            # 单个超过上限的图片在没有其他数据时也允许读取
+            await budget.release(60)
+            await asyncio.wait_for(budget.acquire(500), 1)
+
+        asyncio.run(scenario())
+
+
+@unittest.skipIf(aiohttp is None, "未安装aiohttp")
+class AsyncDownloadEngineTest(unittest.TestCase):
+    """async引擎：下载章节图片并写入下载清单"""
+
+    def setUp(self):
+        ImageHandler.images = {"/1.jpg": make_jpeg("red"), "/2.jpg": make_jpeg("blue")}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.engine = app.AsyncDownloadEngine(4, 1024 * 1024)
+        os.makedirs("chapter")
+
+    def tearDown(self):
+        self.engine.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_download_chapter(self):
+        contents = [{"url": self.base + "/2.jpg"}, {"url": self.base + "/1.jpg"}]
+        self.assertEqual(self.engine.submit(contents, [1, 0], "chapter").result(timeout=10), 2)
+        with open(os.path.join("chapter", "001.jpg"), "rb") as f:
+            self.assertEqual(f.read(), ImageHandler.images["/1.jpg"])
+        manifest = app.ChapterManifest("chapter")
+        self.assertTrue(manifest.is_complete("001.jpg") and manifest.is_complete("002.jpg"))
+        self.assertFalse(os.path.exists(manifest.journal_path))
+
+    def test_failed_page(self):
+        contents = [{"url": self.base + "/1.jpg"}, {"url": self.base + "/missing"}]
+        with mock.patch.object(app, "backoff_delay", return_value=0):
+            self.assertEqual(self.engine.submit(contents, [0, 1], "chapter").result(timeout=10), 1)
+        self.assertFalse(os.path.exists(os.path.join("chapter", "002.jpg")))
+
+
+if __name__ == "__main__":
+    unittest.main()
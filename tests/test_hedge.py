@@ -0,0 +1,138 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+def jpeg(fill):
+    return b"\xff\xd8\xff\xe0" + bytes([fill]) * 1000
+
+
+class FakeResponse:
+    """按块返回图片数据，每块之前可等待"""
+
+    def __init__(self, data, delay=0.0, barrier=None):
+        self.status_code = 200
+        self.headers = {"Content-Length": str(len(data))}
+        self._data = data
+        self._delay = delay
+        self._barrier = barrier
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def iter_content(self, size):
+        for i in range(0, len(self._data), 250):
+            time.sleep(self._delay)
+            yield self._data[i:i + 250]
+        if self._barrier is not None:
+            # 两个请求同时读完最后一个数据块
+            self._barrier.wait()
+
+
+class HedgePolicyTest(unittest.TestCase):
+    def test_threshold(self):
+        policy = app.HedgePolicy()
+        policy.configure(enabled=True, min_delay=0.05)
+        for _ in range(policy.MIN_SAMPLES - 1):
+            policy.observe(0.1)
+        self.assertIsNone(policy.start_request())
+        policy.observe(1.0)
+        self.assertEqual(policy.threshold(), 1.0)
+        # 只使用最近WINDOW个样本，阈值不低于min_delay
+        for _ in range(policy.WINDOW):
+            policy.observe(0.01)
+        self.assertEqual(policy.threshold(), 0.05)
+
+    def test_disabled(self):
+        policy = app.HedgePolicy()
+        for _ in range(50):
+            policy.observe(0.1)
+        self.assertIsNone(policy.start_request())
+        self.assertEqual(policy.requests, 0)
+
+    def test_quota(self):
+        policy = app.HedgePolicy()
+        policy.configure(enabled=True, ratio=0.1)
+        for _ in range(25):
+            policy.start_request()
+        self.assertEqual([policy.try_fire() for _ in range(4)], [True, True, False, False])
+
+
+class HedgedFetchTest(unittest.TestCase):
+    """对冲请求：使用先完成的结果，只有一方写入图片"""
+
+    def setUp(self):
+        self.policy = app.HedgePolicy()
+        self.policy.configure(enabled=True, ratio=1.0, min_delay=0.05)
+        for _ in range(self.policy.MIN_SAMPLES):
+            self.policy.observe(0.01)
+        self.responses = []
+        patchers = [
+            mock.patch.object(app, "hedge_policy", self.policy),
+            mock.patch.object(app.http_client, "get", side_effect=lambda *args, **kwargs: self.responses.pop(0)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_hedge_wins(self):
+        self.responses = [FakeResponse(jpeg(1), delay=0.2), FakeResponse(jpeg(2))]
+        size, _ = app.fetch_page_hedged("http://x/1", "001.jpg", {})
+        self.assertEqual(size, len(jpeg(2)))
+        with open("001.jpg", "rb") as f:
+            self.assertEqual(f.read(), jpeg(2))
+        self.assertEqual((self.policy.fired, self.policy.won), (1, 1))
+        time.sleep(0.5)
+        # 落后的原请求放弃下载，不覆盖图片也不留下临时文件
+        with open("001.jpg", "rb") as f:
+            self.assertEqual(f.read(), jpeg(2))
+        self.assertEqual(os.listdir("."), ["001.jpg"])
+
+    def test_fast_primary_no_hedge(self):
+        self.responses = [FakeResponse(jpeg(1))]
+        app.fetch_page_hedged("http://x/1", "001.jpg", {})
+        self.assertEqual(self.policy.fired, 0)
+
+    def test_commit_exclusive(self):
+        # 两个请求同时读完：只有一方提交，另一方放弃并删除临时文件
+        for _ in range(20):
+            barrier = threading.Barrier(2)
+            self.responses = [FakeResponse(jpeg(1), barrier=barrier), FakeResponse(jpeg(2), barrier=barrier)]
+            cancel = threading.Event()
+            results = []
+
+            def fetch(suffix):
+                try:
+                    results.append(app.fetch_page("http://x/1", "001.jpg", {}, cancel, suffix))
+                except RuntimeError:
+                    results.append(None)
+
+            threads = [threading.Thread(target=fetch, args=(suffix,)) for suffix in (".part", ".hedge.part")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            committed = [result for result in results if result is not None]
+            self.assertEqual(len(committed), 1)
+            self.assertEqual(os.listdir("."), ["001.jpg"])
+            os.remove("001.jpg")
+
+    def test_shutdown_cancels_in_flight(self):
+        cancel = threading.Event()
+        self.policy.register(cancel)
+        self.policy.shutdown()
+        self.assertTrue(cancel.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = self.headers.get("User-Agent", "").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class HttpClientTest(unittest.TestCase):
+    """共享HTTP客户端：同一域名复用长连接，请求头统一设置"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        self.client = app.HttpClient(pool_size=2, connect_timeout=5, read_timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuse_connection(self):
+        for _ in range(5):
+            response = self.client.get(self.url)
+            self.assertEqual(response.text, app.COPY_HEADERS["User-Agent"])
+        host = f"127.0.0.1:{self.server.server_port}"
+        self.assertEqual(self.client.stats()[host], {"requests": 5, "hits": 4, "misses": 1})
+
+    def test_session_per_host(self):
+        self.assertIs(self.client.session(self.url + "a"), self.client.session(self.url + "b"))
+        self.assertIsNot(self.client.session(self.url), self.client.session("http://localhost:1/"))
+
+    def test_configure_rebuilds_sessions(self):
+        session = self.client.session(self.url)
+        self.client.configure(pool_size=2)
+        self.assertIs(self.client.session(self.url), session)
+        self.client.configure(pool_size=4)
+        self.assertIsNot(self.client.session(self.url), session)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class OutputProcessLoggingTest(unittest.TestCase):
+    """进程池子进程不应沿用父进程的进度条锁"""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.workdir = tempfile.TemporaryDirectory()
+        os.chdir(self.workdir.name)
+        app.setup_rotating_logger()
+
+    def tearDown(self):
+        app.shutdown_output_executor()
+        app.stop_logging()
+        app.logger.handlers.clear()
+        os.chdir(self.cwd)
+        self.workdir.cleanup()
+
+    def test_log_while_progress_lock_held(self):
+        # 进程池在下载线程持有进度条锁时启动，子进程输出日志也不能阻塞
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with app.download_progress.lock:
+                acquired.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold_lock, daemon=True)
+        holder.start()
+        acquired.wait()
+        try:
+            future = app.get_output_executor().submit(app.logger.info, "子进程日志")
+            self.assertIsNone(future.result(timeout=10))
+        finally:
+            release.set()
+            holder.join()
+
+
+class QueuedLoggingTest(unittest.TestCase):
+    """日志经后台线程写入文件，日志文件可选JSON格式"""
+
+    def setUp(self):
+        self.format = app.log_format
+        self.addCleanup(setattr, app, "log_format", self.format)
+        self.addCleanup(app.logger.handlers.clear)
+        self.addCleanup(app.stop_logging)
+
+    def read_log(self):
+        app.stop_logging()
+        (name,) = os.listdir("logs")
+        with open(os.path.join("logs", name), encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_text_log(self):
+        app.setup_rotating_logger()
+        app.logger.debug("调试信息")
+        lines = self.read_log()
+        self.assertEqual(len(lines), 1)
+        self.assertIn("DEBUG - 调试信息", lines[0])
+
+    def test_json_log(self):
+        app.log_format = "json"
+        app.setup_rotating_logger()
+        try:
+            raise ValueError("bad page")
+        except ValueError:
+            app.logger.exception("下载失败")
+        entry = json.loads(self.read_log()[0])
+        self.assertEqual(entry["level"], "ERROR")
+        self.assertEqual(entry["message"], "下载失败")
+        self.assertIn("ValueError: bad page", entry["exception"])
+
+    def test_switch_format(self):
+        app.setup_rotating_logger()
+        app.configure_log_format("json")
+        app.logger.info("切换格式")
+        self.assertEqual(json.loads(self.read_log()[0])["message"], "切换格式")
+
+
+class TtyStream(io.StringIO):
+    def isatty(self):
+        return True
+
+
+class DownloadProgressTest(unittest.TestCase):
+    """下载进度按章节汇总到一行进度条，非终端时不输出"""
+
+    def test_aggregate_chapters(self):
+        stream = TtyStream()
+        progress = app.DownloadProgress(stream)
+        progress.start("a", 10)
+        progress.start("b", 10)
+        progress.advance("a", 5)
+        progress.advance("b", failed=True)
+        progress.draw(force=True)
+        last = stream.getvalue().split("\r\033[K")[-1]
+        self.assertIn("6/20 页 · 2 个章节 · 失败 1 页", last)
+        self.assertGreaterEqual(progress.finish("a"), 0)
+        progress.finish("b")
+        self.assertTrue(stream.getvalue().endswith("\r\033[K"))
+        self.assertEqual(progress.finish("missing"), 0)
+
+    def test_not_a_terminal(self):
+        stream = io.StringIO()
+        progress = app.DownloadProgress(stream)
+        progress.start("a", 10)
+        progress.advance("a", 10)
+        progress.finish("a")
+        self.assertEqual(stream.getvalue(), "")
+
+    def test_console_handler_redraws(self):
+        stream = TtyStream()
+        progress = app.DownloadProgress(stream)
+        progress.start("a", 4)
+        handler = app.ConsoleHandler(stream)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        with mock.patch.object(app, "download_progress", progress):
+            handler.emit(logging.makeLogRecord({"msg": "章节完成"}))
+        output = stream.getvalue()
+        self.assertIn("\r\033[K章节完成\n", output)
+        self.assertTrue(output.endswith("0/4 页 · 1 个章节"))
+
+
+if __name__ == "__main__":
+    unittest.main()
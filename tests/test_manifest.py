@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class ChapterManifestTest(unittest.TestCase):
+    """下载清单：每页追加日志，章节结束时合并写入 manifest.json"""
+
+    def write_page(self, filename, data):
+        with open(os.path.join("chapter", filename), "wb") as f:
+            f.write(data)
+        return len(data), hashlib.sha256(data).hexdigest()
+
+    def setUp(self):
+        os.makedirs("chapter")
+
+    def test_record_appends_journal(self):
+        manifest = app.ChapterManifest("chapter")
+        for i in range(1, 4):
+            manifest.record(f"{i:03d}.jpg", f"http://x/{i}", *self.write_page(f"{i:03d}.jpg", bytes([i]) * 10))
+        self.assertFalse(os.path.exists(manifest.path))
+        with open(manifest.journal_path, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+        manifest.save()
+        self.assertFalse(os.path.exists(manifest.journal_path))
+        with open(manifest.path, encoding="utf-8") as f:
+            self.assertEqual(sorted(json.load(f)["pages"]), ["001.jpg", "002.jpg", "003.jpg"])
+        self.assertTrue(app.ChapterManifest("chapter").is_complete("002.jpg"))
+
+    def test_damaged_page_is_incomplete(self):
+        manifest = app.ChapterManifest("chapter")
+        manifest.record("001.jpg", "http://x/1", *self.write_page("001.jpg", b"page"))
+        manifest.record("002.jpg", "http://x/2", *self.write_page("002.jpg", b"page"))
+        self.write_page("001.jpg", b"PAGE")
+        os.remove(os.path.join("chapter", "002.jpg"))
+        self.assertFalse(manifest.is_complete("001.jpg"))
+        self.assertFalse(manifest.is_complete("002.jpg"))
+        self.assertFalse(manifest.is_complete("003.jpg"))
+
+    def test_replay_interrupted_journal(self):
+        manifest = app.ChapterManifest("chapter")
+        manifest.record("001.jpg", "http://x/1", *self.write_page("001.jpg", b"page"))
+        manifest._journal.write('{"file": "002.jpg", "url"')
+        manifest._journal.close()
+
+        reloaded = app.ChapterManifest("chapter")
+        self.assertEqual(list(reloaded.pages), ["001.jpg"])
+        self.assertTrue(reloaded.is_complete("001.jpg"))
+        self.assertFalse(reloaded.is_complete("002.jpg"))
+
+    def test_skip_journal_when_packing(self):
+        manifest = app.ChapterManifest("chapter")
+        manifest.record("001.jpg", "http://x/1", *self.write_page("001.jpg", b"page"))
+        manifest._journal.flush()
+        names = [name for _, name in app.pack_entry_files("chapter")]
+        self.assertEqual([os.path.basename(name) for name in names], ["001.jpg"])
+        manifest.save()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class RunMetricsTest(unittest.TestCase):
+    """运行统计：耗时分位数、事件计数，输出JSON报告和Prometheus textfile"""
+
+    def setUp(self):
+        self.metrics = app.RunMetrics()
+        for i in range(1, 101):
+            self.metrics.observe("page", i / 100)
+        with self.metrics.span("api.chapters"):
+            pass
+        self.metrics.count("page_retries", "timeout")
+        self.metrics.count("page_retries", "timeout")
+        self.metrics.count("page_failures", app.failure_cause(status=503))
+        self.metrics.record_comic("漫画", 12.3456, 3, 2)
+
+    def test_summary(self):
+        report = self.metrics.summary()
+        page = report["spans"]["page"]
+        self.assertEqual(page["count"], 100)
+        self.assertEqual(page["p50"], 0.51)
+        self.assertEqual(page["p95"], 0.96)
+        self.assertEqual(page["max"], 1.0)
+        self.assertEqual(page["buckets"]["0.5"], 50)
+        self.assertEqual(report["spans"]["api.chapters"]["count"], 1)
+        self.assertEqual(report["counters"], {"page_retries": {"timeout": 2}, "page_failures": {"http_503": 1}})
+        self.assertEqual(report["comics"]["漫画"], {"seconds": 12.346, "chapters": 3, "success": 2})
+
+    def test_write_report(self):
+        self.metrics.write_report(os.path.join("reports", "report.json"))
+        with open(os.path.join("reports", "report.json"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["counters"]["page_retries"], {"timeout": 2})
+
+    def test_write_textfile(self):
+        self.metrics.write_textfile("metrics.prom")
+        with open("metrics.prom", encoding="utf-8") as f:
+            text = f.read()
+        self.assertIn('mkk_comic_span_seconds_bucket{span="page",le="0.5"} 50', text)
+        self.assertIn('mkk_comic_span_seconds_count{span="page"} 100', text)
+        self.assertIn('mkk_comic_events_total{event="page_retries",cause="timeout"} 2', text)
+        self.assertIn('mkk_comic_comic_seconds{comic="漫画"} 12.346', text)
+
+    def test_failure_cause(self):
+        self.assertEqual(app.failure_cause(app.requests.exceptions.ReadTimeout()), "timeout")
+        self.assertEqual(app.failure_cause(app.requests.exceptions.ConnectionError()), "connection")
+        self.assertEqual(app.failure_cause(ValueError("x")), "ValueError")
+
+    def test_write_run_reports(self):
+        with mock.patch.object(app, "metrics", self.metrics), \
+                mock.patch.object(app, "report_switch", 1), \
+                mock.patch.object(app, "metrics_textfile", os.path.join("prom", "mkk.prom")):
+            app.write_run_reports()
+        self.assertEqual(len(os.listdir(app.REPORT_DIR)), 1)
+        self.assertTrue(os.path.exists(os.path.join("prom", "mkk.prom")))
+
+    def test_optional_setting(self):
+        for value in (None, "", "None"):
+            self.assertIsNone(app.optional_setting(value))
+        self.assertEqual(app.optional_setting("metrics.prom"), "metrics.prom")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+def make_chapter(output_dir, pages):
+    os.makedirs(output_dir)
+    for i in range(1, pages + 1):
+        Image.new("RGB", (60, 90), (i * 40, 0, 0)).save(os.path.join(output_dir, f"{i:03d}.jpg"), "JPEG")
+    return {"index": 1, "chapter_name": os.path.basename(output_dir), "output_dir": output_dir,
+            "contents": [{}] * pages}
+
+
+class BuildChapterOutputTest(unittest.TestCase):
+    """输出转换在进程池中执行，不阻塞下载"""
+
+    def setUp(self):
+        patcher = mock.patch.object(app, "output_workers", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(app.shutdown_output_executor)
+        self.meta = make_chapter(os.path.join("out", "comic", "第1话"), 2)
+
+    def test_pdf_in_process_pool(self):
+        future = app.build_chapter_output(self.meta, {"output_format": "pdf"})
+        self.assertIsNotNone(app.output_executor)
+        output = future.result(timeout=30)
+        self.assertEqual(output, os.path.abspath(os.path.join("out", "comic", "第1话.pdf")))
+        self.assertTrue(os.path.exists(output))
+
+    def test_no_output(self):
+        future = app.build_chapter_output(self.meta, {"output_format": "none"})
+        self.assertEqual(future.result(), self.meta["output_dir"])
+        self.assertIsNone(app.output_executor)
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            app.build_chapter_output(self.meta, {"output_format": "docx"}).result()
+
+    def test_wait_chapter_output(self):
+        with mock.patch.object(app, "run_outputs", []) as run_outputs:
+            self.assertTrue(app.wait_chapter_output(1, app.build_chapter_output(self.meta, {"output_format": "cbz"})))
+            failed = app.Future()
+            failed.set_exception(OSError("disk full"))
+            self.assertFalse(app.wait_chapter_output(2, failed))
+        self.assertEqual(run_outputs, [os.path.abspath(os.path.join("out", "comic", "第1话.cbz"))])
+
+
+if __name__ == "__main__":
+    unittest.main()
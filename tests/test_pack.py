@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+import time
+import unittest
+import zipfile
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+KB = 1024
+
+
+def write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return path
+
+
+class PackOutputsTest(unittest.TestCase):
+    """按章节打包：每个压缩包不超过大小上限，章节不拆分，同一漫画的章节连续存放"""
+
+    def test_split_by_size(self):
+        outputs = [write_file(os.path.join("out", "A", f"第{i}话.pdf"), 40 * KB) for i in (1, 2, 3)]
+        manifest = app.pack_outputs(outputs, "pack", max_bytes=100 * KB)
+        self.assertEqual([part["file"] for part in manifest["parts"]], ["comic_part01.zip", "comic_part02.zip"])
+        self.assertEqual([[c["chapter"] for c in part["chapters"]] for part in manifest["parts"]],
+                         [["第1话.pdf", "第2话.pdf"], ["第3话.pdf"]])
+        for part in manifest["parts"]:
+            path = os.path.join("pack", part["file"])
+            self.assertEqual(os.path.getsize(path), part["size"])
+            self.assertLessEqual(part["size"], 100 * KB)
+            self.assertFalse(part["oversize"])
+        with zipfile.ZipFile(os.path.join("pack", "comic_part01.zip")) as zf:
+            self.assertEqual(zf.namelist(), ["A/第1话.pdf", "A/第2话.pdf"])
+        with open(os.path.join("pack", app.PACK_MANIFEST), encoding="utf-8") as f:
+            self.assertEqual(json.load(f), manifest)
+
+    def test_oversize_chapter(self):
+        outputs = [write_file(os.path.join("out", "A", "第1话.pdf"), 10 * KB),
+                   write_file(os.path.join("out", "A", "第2话.pdf"), 200 * KB)]
+        manifest = app.pack_outputs(outputs, "pack", max_bytes=100 * KB)
+        self.assertEqual([part["oversize"] for part in manifest["parts"]], [False, True])
+
+    def test_group_by_comic(self):
+        outputs = [write_file(os.path.join("out", comic, f"{i}.pdf"), KB) for comic, i in (("A", 1), ("B", 1), ("A", 2))]
+        manifest = app.pack_outputs(outputs, "pack", max_bytes=100 * KB)
+        self.assertEqual([(c["comic"], c["chapter"]) for c in manifest["parts"][0]["chapters"]],
+                         [("A", "1.pdf"), ("A", "2.pdf"), ("B", "1.pdf")])
+
+    def test_image_directory_skips_manifest(self):
+        chapter = os.path.join("out", "A", "第1话")
+        write_file(os.path.join(chapter, "001.jpg"), KB)
+        write_file(os.path.join(chapter, "002.jpg.part"), KB)
+        write_file(os.path.join(chapter, app.ChapterManifest.FILE_NAME), 10)
+        app.pack_outputs([chapter], "pack", max_bytes=100 * KB)
+        with zipfile.ZipFile(os.path.join("pack", "comic_part01.zip")) as zf:
+            self.assertEqual(zf.namelist(), ["A/第1话/001.jpg"])
+
+    def test_remove_previous_parts(self):
+        write_file(os.path.join("pack", "comic_part09.zip"), 10)
+        write_file(os.path.join("pack", "other.txt"), 10)
+        manifest = app.pack_outputs([], "pack", max_bytes=100 * KB)
+        self.assertEqual(manifest["parts"], [])
+        self.assertEqual(sorted(os.listdir("pack")), [app.PACK_MANIFEST, "other.txt"])
+
+    def test_default_uses_run_outputs(self):
+        write_file(os.path.join("out", "A", "old.pdf"), KB)
+        new = write_file(os.path.join("out", "A", "new.pdf"), KB)
+        with mock.patch.object(app, "run_outputs", [new]):
+            manifest = app.pack_outputs(pack_dir="pack", max_bytes=100 * KB)
+        self.assertEqual([c["chapter"] for c in manifest["parts"][0]["chapters"]], ["new.pdf"])
+
+    def test_scan_out_dir(self):
+        chapter = os.path.join("out", "A", "第1话")
+        write_file(os.path.join(chapter, "001.jpg"), KB)
+        pdf = write_file(chapter + ".pdf", KB)
+        later = os.path.join("out", "A", "第2话")
+        write_file(os.path.join(later, "001.jpg"), KB)
+        os.utime(later, (time.time() + 10, time.time() + 10))
+        write_file(os.path.join("out", "A", "第3话.pdf.part"), KB)
+        self.assertEqual(app.scan_out_dir("out"), [pdf, later])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class PageSchedulerTest(unittest.TestCase):
+    """全局下载调度：所有章节共用下载线程，优先完成剩余图片最少的章节"""
+
+    def test_result_counts(self):
+        scheduler = app.PageScheduler(3)
+        tasks = [lambda: True, lambda: False, lambda: 1 / 0, lambda: True]
+        self.assertEqual(scheduler.submit(tasks, done_count=2).result(timeout=5), 4)
+        self.assertEqual(scheduler.submit([], done_count=7).result(timeout=5), 7)
+
+    def test_prefer_nearly_done_chapter(self):
+        scheduler = app.PageScheduler(1)
+        gate = threading.Event()
+        order = []
+
+        def task(name):
+            def run():
+                order.append(name)
+                return True
+            return run
+
+        blocker = scheduler.submit([gate.wait])
+        long_job = scheduler.submit([task(f"a{i}") for i in range(4)])
+        short_job = scheduler.submit([task(f"b{i}") for i in range(2)])
+        gate.set()
+        self.assertEqual(long_job.result(timeout=5), 4)
+        self.assertEqual(short_job.result(timeout=5), 2)
+        self.assertTrue(blocker.result(timeout=5))
+        self.assertEqual(order, ["b0", "b1", "a0", "a1", "a2", "a3"])
+
+    def test_worker_limit(self):
+        scheduler = app.PageScheduler(3)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def task():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+            return True
+
+        futures = [scheduler.submit([task] * 5) for _ in range(3)]
+        self.assertEqual([future.result(timeout=5) for future in futures], [5, 5, 5])
+        self.assertLessEqual(max(peak), 3)
+
+    def test_cancel_pending(self):
+        scheduler = app.PageScheduler(1)
+        gate = threading.Event()
+        started = []
+
+        def task():
+            started.append(1)
+            return True
+
+        blocker = scheduler.submit([gate.wait])
+        future = scheduler.submit([task] * 10)
+        self.assertTrue(scheduler.cancel(future))
+        self.assertEqual(future.result(timeout=5), 0)
+        gate.set()
+        blocker.result(timeout=5)
+        self.assertEqual(started, [])
+        self.assertFalse(scheduler.cancel(future))
+
+    def test_shrink_workers(self):
+        scheduler = app.PageScheduler(4)
+        scheduler.submit([lambda: True] * 8).result(timeout=5)
+        scheduler.configure(1)
+        self.assertEqual(scheduler.submit([lambda: True] * 4).result(timeout=5), 4)
+        time.sleep(0.1)
+        self.assertEqual(len([thread for thread in scheduler._threads if thread.is_alive()]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+def write_page(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data), hashlib.sha256(data).hexdigest()
+
+
+class PageStoreTest(unittest.TestCase):
+    """内容寻址图片存储：相同内容只保存一份，已下载过的URL直接链接"""
+
+    def setUp(self):
+        self.store = app.PageStore("page_store")
+
+    def test_store_new_page(self):
+        size, sha256 = write_page(os.path.join("a", "001.jpg"), b"page-1")
+        self.store.add("http://x/1", os.path.join("a", "001.jpg"), size, sha256)
+        blob = self.store.blob_path(sha256)
+        self.assertTrue(os.path.samefile(blob, os.path.join("a", "001.jpg")))
+        self.assertEqual(self.store._stats["stored"], 1)
+
+    def test_dedup_same_content(self):
+        size, sha256 = write_page(os.path.join("a", "001.jpg"), b"same")
+        self.store.add("http://x/1", os.path.join("a", "001.jpg"), size, sha256)
+        write_page(os.path.join("b", "001.jpg"), b"same")
+        self.store.add("http://x/2", os.path.join("b", "001.jpg"), size, sha256)
+        self.assertTrue(os.path.samefile(os.path.join("a", "001.jpg"), os.path.join("b", "001.jpg")))
+        self.assertEqual(self.store._stats["duplicate"], 1)
+        self.assertEqual(os.listdir(os.path.dirname(self.store.blob_path(sha256))), [sha256])
+
+    def test_restore_by_url(self):
+        size, sha256 = write_page(os.path.join("a", "001.jpg"), b"page-1")
+        self.store.add("http://x/1", os.path.join("a", "001.jpg"), size, sha256)
+        os.makedirs("b")
+        self.assertEqual(self.store.restore("http://x/1", os.path.join("b", "005.jpg")), (size, sha256))
+        with open(os.path.join("b", "005.jpg"), "rb") as f:
+            self.assertEqual(f.read(), b"page-1")
+        self.assertIsNone(self.store.restore("http://x/2", os.path.join("b", "006.jpg")))
+
+    def test_restore_missing_blob(self):
+        size, sha256 = write_page(os.path.join("a", "001.jpg"), b"page-1")
+        self.store.add("http://x/1", os.path.join("a", "001.jpg"), size, sha256)
+        os.remove(self.store.blob_path(sha256))
+        self.assertIsNone(self.store.restore("http://x/1", os.path.join("a", "002.jpg")))
+
+    def test_copy_without_hardlinks(self):
+        size, sha256 = write_page(os.path.join("a", "001.jpg"), b"page-1")
+        with mock.patch.object(app.os, "link", side_effect=OSError("not supported")):
+            self.store.add("http://x/1", os.path.join("a", "001.jpg"), size, sha256)
+            self.assertEqual(self.store.restore("http://x/1", os.path.join("a", "002.jpg")), (size, sha256))
+        with open(self.store.blob_path(sha256), "rb") as f:
+            self.assertEqual(f.read(), b"page-1")
+
+    def test_concurrent_add(self):
+        paths = [os.path.join(f"c{i}", "001.jpg") for i in range(20)]
+        for path in paths:
+            size, sha256 = write_page(path, b"same")
+        errors = []
+
+        def add(i, path):
+            try:
+                self.store.add(f"http://x/{i}", path, size, sha256)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=add, args=item) for item in enumerate(paths)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        blob = self.store.blob_path(sha256)
+        self.assertTrue(all(os.path.samefile(blob, path) for path in paths))
+        self.assertEqual(self.store._stats["stored"], 1)
+        self.assertEqual(os.listdir(os.path.dirname(blob)), [sha256])
+
+    def test_restore_page_records_manifest(self):
+        size, sha256 = write_page(os.path.join("a", "001.jpg"), b"page-1")
+        self.store.add("http://x/1", os.path.join("a", "001.jpg"), size, sha256)
+        os.makedirs("b")
+        manifest = app.ChapterManifest("b")
+        with mock.patch.object(app, "page_store", self.store), mock.patch.object(app, "page_store_switch", 1):
+            self.assertTrue(app.restore_page("http://x/1", os.path.join("b", "001.jpg"), manifest))
+        self.assertTrue(manifest.is_complete("001.jpg"))
+        manifest.save()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import hashlib
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 200
+
+
+class PageWriterTest(unittest.TestCase):
+    """流式写入：边下载边计算sha256，校验文件头和Content-Length后原子重命名"""
+
+    def test_commit(self):
+        writer = app.PageWriter("001.jpg", len(JPEG))
+        for i in range(0, len(JPEG), 7):
+            writer.write(JPEG[i:i + 7])
+        self.assertFalse(os.path.exists("001.jpg"))
+        self.assertEqual(writer.commit(), (len(JPEG), hashlib.sha256(JPEG).hexdigest()))
+        self.assertEqual(os.listdir("."), ["001.jpg"])
+
+    def test_reject_bad_head_early(self):
+        writer = app.PageWriter("001.jpg")
+        with self.assertRaises(ValueError):
+            writer.write(b"<html>error page</html>")
+        writer.abort()
+        self.assertEqual(os.listdir("."), [])
+
+    def test_reject_truncated(self):
+        writer = app.PageWriter("001.jpg", len(JPEG) + 10)
+        writer.write(JPEG)
+        with self.assertRaises(ValueError):
+            writer.commit()
+        self.assertEqual(os.listdir("."), [])
+
+    def test_keep_existing_page_on_failure(self):
+        with open("001.jpg", "wb") as f:
+            f.write(JPEG)
+        writer = app.PageWriter("001.jpg", len(JPEG))
+        writer.write(JPEG[:50])
+        with self.assertRaises(ValueError):
+            writer.commit()
+        with open("001.jpg", "rb") as f:
+            self.assertEqual(f.read(), JPEG)
+
+
+class ContentLengthTest(unittest.TestCase):
+    def test_content_length(self):
+        self.assertEqual(app.content_length({"Content-Length": "12"}), 12)
+        self.assertIsNone(app.content_length({}))
+        self.assertIsNone(app.content_length({"Content-Length": "x"}))
+        # 压缩响应解压后的字节数与Content-Length不一致
+        self.assertIsNone(app.content_length({"Content-Length": "12", "Content-Encoding": "gzip"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
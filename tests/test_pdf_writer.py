@@ -0,0 +1,81 @@
+import io
+import os
+import sys
+import unittest
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+
+def save_image(path, size, color, image_format):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, image_format)
+    with open(path, "wb") as f:
+        f.write(buffer.getvalue())
+    return buffer.getvalue()
+
+
+class DirectPdfWriterTest(unittest.TestCase):
+    """JPEG原样嵌入PDF，其他格式转换为JPEG，支持加密"""
+
+    def setUp(self):
+        os.makedirs("chapter")
+        self.jpeg = save_image(os.path.join("chapter", "001.jpg"), (300, 500), "red", "JPEG")
+        # 图片文件名统一为.jpg，真实格式可能是PNG
+        save_image(os.path.join("chapter", "002.jpg"), (400, 200), "blue", "PNG")
+
+    def test_read_jpeg_info(self):
+        self.assertEqual(app.read_jpeg_info(self.jpeg), (300, 500, 3, False))
+        self.assertIsNone(app.read_jpeg_info(b"\xff\xd8garbage"))
+
+    def test_jpeg_passthrough(self):
+        app.images_to_pdf("chapter", "out.pdf", 2)
+        with open("out.pdf", "rb") as f:
+            data = f.read()
+        self.assertTrue(data.startswith(b"%PDF-1.4"))
+        self.assertIn(self.jpeg, data)
+        self.assertEqual(data.count(b"/Filter /DCTDecode"), 2)
+        self.assertIn(b"/Width 400 /Height 200", data)
+        self.assertFalse(os.path.exists("out.pdf.part"))
+
+    def test_make_pdf_output_path(self):
+        output = app.make_pdf("chapter", 2)
+        self.assertEqual(output, os.path.abspath("chapter.pdf"))
+        self.assertTrue(os.path.exists(output))
+
+    @unittest.skipIf(pypdf is None, "未安装pypdf")
+    def test_readable(self):
+        app.images_to_pdf("chapter", "out.pdf", 3)
+        reader = pypdf.PdfReader("out.pdf")
+        self.assertEqual(len(reader.pages), 2)
+        image = reader.pages[0]["/Resources"]["/XObject"]["/Im0"].get_object()
+        self.assertEqual(image.get_data(), self.jpeg)
+
+    def test_encrypted(self):
+        app.images_to_pdf("chapter", "out.pdf", 2, password="secret")
+        with open("out.pdf", "rb") as f:
+            data = f.read()
+        self.assertIn(b"/Encrypt", data)
+        self.assertNotIn(self.jpeg, data)
+
+    @unittest.skipIf(pypdf is None, "未安装pypdf")
+    def test_decrypt(self):
+        app.images_to_pdf("chapter", "out.pdf", 2, password="secret")
+        reader = pypdf.PdfReader("out.pdf")
+        self.assertTrue(reader.is_encrypted)
+        self.assertFalse(reader.decrypt("wrong"))
+        self.assertTrue(reader.decrypt("secret"))
+        image = reader.pages[0]["/Resources"]["/XObject"]["/Im0"].get_object()
+        self.assertEqual(image.get_data(), self.jpeg)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class RunChapterPipelineTest(unittest.TestCase):
+    """流水线某个阶段出错时应记为章节失败并正常结束，而不是一直等待"""
+
+    def run_pipeline(self, *args, **kwargs):
+        result = {}
+
+        def target():
+            result["report"] = app.run_chapter_pipeline(*args, **kwargs)
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive(), "流水线未结束")
+        return result["report"]
+
+    def test_results_in_chapter_order(self):
+        # 第1章转换最慢：后续章节在此期间继续下载，结果仍按章节顺序提交
+        started = []
+        first_output = app.Future()
+
+        def fetch_meta(path, index, chapter_info):
+            return {"index": index, "output_dir": f"out/{index}", "contents": []}
+
+        def start_download(meta):
+            started.append(meta["index"])
+            future = app.Future()
+            future.set_result(True)
+            return future
+
+        def build_output(meta, comic_config=None):
+            if meta["index"] == 1:
+                return first_output
+            future = app.Future()
+            future.set_result(meta["output_dir"])
+            return future
+
+        def finish_first_output():
+            started_before_first_output.extend(started)
+            first_output.set_result("out/1")
+
+        started_before_first_output = []
+        committed = []
+        threading.Timer(0.3, finish_first_output).start()
+        with mock.patch.object(app, "fetch_chapter_meta", side_effect=fetch_meta), \
+                mock.patch.object(app, "start_chapter_download", side_effect=start_download), \
+                mock.patch.object(app, "build_chapter_output", side_effect=build_output), \
+                mock.patch.object(app, "run_outputs", []) as run_outputs:
+            report = self.run_pipeline([(1, {}), (2, {}), (3, {})], "x", on_success=committed.append)
+        self.assertEqual(started_before_first_output, [1, 2, 3])
+        self.assertEqual(report, [(1, True), (2, True), (3, True)])
+        self.assertEqual(committed, [1, 2, 3])
+        self.assertEqual(run_outputs, ["out/1", "out/2", "out/3"])
+
+    def test_meta_stage_error(self):
+        with mock.patch.object(app, "fetch_chapter_meta", side_effect=KeyError("chapter")):
+            report = self.run_pipeline([(1, {}), (2, {})], "x")
+        self.assertEqual(report, [(1, False), (2, False)])
+
+    def test_output_stage_error(self):
+        meta = {"output_dir": "x", "contents": []}
+        done = app.Future()
+        done.set_result(True)
+        with mock.patch.object(app, "fetch_chapter_meta", return_value=meta), \
+                mock.patch.object(app, "start_chapter_download", return_value=done), \
+                mock.patch.object(app, "build_chapter_output", side_effect=TypeError("transcode")):
+            report = self.run_pipeline([(1, {}), (2, {})], "x")
+        self.assertEqual(report, [(1, False), (2, False)])
+
+    def test_stop_on_failure_cancels_prefetched_chapters(self):
+        # 第1章失败后终止，已提交的后续章节中尚未开始的图片应被取消
+        scheduler = app.PageScheduler(1)
+        started = []
+
+        def page_task():
+            started.append(1)
+            time.sleep(0.05)
+            return True
+
+        def fetch_meta(path, index, chapter_info):
+            if index == 1:
+                return None
+            return {"comic_name": "x", "chapter_name": f"第{index}话", "output_dir": f"out/{index}",
+                    "contents": [{}] * 50, "words": list(range(50))}
+
+        def submit_images(contents, words, output_dir):
+            return scheduler.submit([page_task] * len(words))
+
+        with mock.patch.object(app, "fetch_chapter_meta", side_effect=fetch_meta), \
+                mock.patch.object(app, "page_scheduler", scheduler), \
+                mock.patch.object(app, "submit_chapter_images", side_effect=submit_images):
+            report = self.run_pipeline([(1, {}), (2, {}), (3, {})], "x", stop_on_failure=True)
+            time.sleep(0.3)
+        self.assertEqual(report, [(1, False)])
+        self.assertEqual(scheduler._jobs, [])
+        self.assertLess(len(started), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
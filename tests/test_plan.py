@@ -0,0 +1,67 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class DownloadBudgetTest(unittest.TestCase):
+    """字节预算：各漫画轮流分配章节，章节连续，第一个待下载章节总是分配"""
+
+    def setUp(self):
+        # 每张图片按1MB估算，章节列表中的size为图片张数
+        self.sizes = {}
+        patchers = [
+            mock.patch.object(app, "plan_page_kb", 1024),
+            mock.patch.object(app, "collect_chapters", side_effect=self.collect_chapters),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def collect_chapters(self, path, start, end):
+        return [(i, {"size": self.sizes[path][i - 1]}) for i in range(start, end + 1)]
+
+    def plan(self, *comics):
+        plan = []
+        for name, sizes, budget_mb in comics:
+            self.sizes[name] = sizes
+            comic = {"name": name, "path": name, "budget_mb": budget_mb}
+            plan.append({"idx": len(plan), "comic": comic, "start": 1, "end": len(sizes)})
+        return plan
+
+    def planned(self, plan):
+        return [item["end"] - item["start"] + 1 for item in plan]
+
+    def test_unlimited(self):
+        with mock.patch.object(app, "download_budget_mb", 0):
+            plan = app.apply_download_budget(self.plan(("a", [5, 5, 5], 0), ("b", [5], 0)))
+        self.assertEqual(self.planned(plan), [3, 1])
+
+    def test_round_robin(self):
+        # 总预算30MB：配置靠前的漫画不会占满预算
+        with mock.patch.object(app, "download_budget_mb", 30):
+            plan = app.apply_download_budget(self.plan(("a", [10, 10, 10, 10], 0), ("b", [10, 10], 0)))
+        self.assertEqual(self.planned(plan), [2, 1])
+
+    def test_contiguous(self):
+        # 第2章超出预算后不再下载后面较小的章节
+        with mock.patch.object(app, "download_budget_mb", 0):
+            plan = app.apply_download_budget(self.plan(("a", [5, 50, 5], 20)))
+        self.assertEqual(self.planned(plan), [1])
+
+    def test_first_chapter_over_budget(self):
+        with mock.patch.object(app, "download_budget_mb", 10):
+            plan = app.apply_download_budget(self.plan(("a", [30, 5], 0), ("b", [40], 0)))
+        self.assertEqual(self.planned(plan), [1, 1])
+
+    def test_estimate(self):
+        self.assertEqual(app.estimate_chapter_bytes({"size": 3}), 3 * 1024 * 1024)
+        self.assertEqual(app.estimate_chapter_bytes({}), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import email.utils
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(app.parse_retry_after("3"), 3.0)
+        self.assertEqual(app.parse_retry_after("-1"), 0.0)
+
+    def test_http_date(self):
+        value = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(app.parse_retry_after(value), 30, delta=2)
+
+    def test_invalid(self):
+        self.assertIsNone(app.parse_retry_after(None))
+        self.assertIsNone(app.parse_retry_after("soon"))
+
+
+class RateLimiterTest(unittest.TestCase):
+    """自适应限速：响应正常时线性提速，限流时速率减半，遵循Retry-After"""
+
+    def setUp(self):
+        self.limiter = app.RateLimiter(rate=10, min_rate=1, max_rate=12)
+
+    def test_additive_increase(self):
+        host = self.limiter.host("http://a/1")
+        for _ in range(10):
+            self.limiter.feedback("http://a/2", 200)
+        self.assertAlmostEqual(host.rate, 10.95, places=1)
+        for _ in range(100):
+            self.limiter.feedback("http://a/2", 200)
+        self.assertEqual(host.rate, 12)
+
+    def test_multiplicative_decrease(self):
+        self.limiter.feedback("http://a/1", 429)
+        self.assertEqual(self.limiter.host("http://a/1").rate, 5)
+        self.limiter.feedback("http://a/1", 503)
+        self.limiter.feedback("http://a/1")
+        self.assertEqual(self.limiter.host("http://a/1").rate, 1.25)
+        for _ in range(5):
+            self.limiter.feedback("http://a/1", 500)
+        self.assertEqual(self.limiter.host("http://a/1").rate, 1)
+        self.assertEqual(self.limiter.host("http://a/1").throttled, 8)
+        # 404等客户端错误不降速
+        self.limiter.feedback("http://a/1", 404)
+        self.assertGreater(self.limiter.host("http://a/1").rate, 1)
+
+    def test_hosts_are_independent(self):
+        self.limiter.feedback("http://a/1", 429)
+        self.assertEqual(self.limiter.host("http://b/1").rate, 10)
+
+    def test_retry_after_blocks_host(self):
+        host = self.limiter.host("http://a/1")
+        self.assertEqual(host.reserve(), 0)
+        self.limiter.feedback("http://a/1", 429, retry_after=5)
+        self.assertAlmostEqual(host.reserve(), 5, delta=0.1)
+        self.assertEqual(self.limiter.host("http://b/1").reserve(), 0)
+
+    def test_token_bucket(self):
+        host = app.HostRateLimiter(10, 1, 50)
+        waits = [host.reserve() for _ in range(3)]
+        self.assertEqual(waits[0], 0)
+        self.assertAlmostEqual(waits[1], 0.1, delta=0.01)
+        self.assertAlmostEqual(waits[2], 0.2, delta=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("PIL", "reportlab", "yaml", "aiohttp")
+
+
+class LazyImportTest(unittest.TestCase):
+    """启动时不导入PIL/reportlab等重量级依赖，用到时才加载"""
+
+    def loaded_modules(self, code):
+        script = (f"import sys; sys.path.insert(0, {APP_DIR!r}); import app; {code}; import json; "
+                  f"print(json.dumps([name for name in {LAZY_MODULES!r} if name in sys.modules]))")
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def test_import_app(self):
+        self.assertEqual(self.loaded_modules("pass"), [])
+
+    def test_cli_parser(self):
+        self.assertEqual(self.loaded_modules("app.build_arg_parser().parse_args(['pack'])"), [])
+
+    def test_loaded_on_use(self):
+        self.assertEqual(self.loaded_modules("app.transcode_size(1, 1, 1, 1); app.StateStore.read_snapshot(None)"), [])
+        os.makedirs("chapter")
+        from PIL import Image
+        Image.new("RGB", (10, 10)).save(os.path.join("chapter", "001.png"), "PNG")
+        os.rename(os.path.join("chapter", "001.png"), os.path.join("chapter", "001.jpg"))
+        self.assertEqual(self.loaded_modules("app.images_to_pdf('chapter', 'out.pdf', 1)"), ["PIL"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+DB_PATH = os.path.join("cache", "state.db")
+SNAPSHOT_PATH = os.path.join("config", "state.yaml")
+
+
+def comics(last_chapter=10):
+    return [{"name": "漫画", "path": "comic", "last_chapter": last_chapter}]
+
+
+class StateStoreTest(unittest.TestCase):
+    """订阅状态：批量提交，数据库丢失或落后时从YAML快照恢复"""
+
+    def setUp(self):
+        self.store = app.StateStore(DB_PATH, batch_size=3, batch_seconds=3600)
+        self.addCleanup(self.store.close)
+
+    def committed_last_chapter(self):
+        # 另一个连接只能读到已提交的状态
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            return conn.execute("SELECT last_chapter FROM subscriptions WHERE path = 'comic'").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_initial_load(self):
+        items = comics()
+        self.store.load(items)
+        self.assertEqual(items[0]["last_chapter"], 10)
+        self.assertEqual(self.committed_last_chapter(), 10)
+
+    def test_batched_commit(self):
+        self.store.load(comics())
+        self.store.update("comic", last_chapter=11)
+        self.store.update("comic", last_chapter=12)
+        self.assertEqual(self.committed_last_chapter(), 10)
+        self.store.update("comic", last_chapter=13)
+        self.assertEqual(self.committed_last_chapter(), 13)
+        self.store.update("comic", last_chapter=14)
+        self.store.flush()
+        self.assertEqual(self.committed_last_chapter(), 14)
+
+    def test_resume_from_database(self):
+        self.store.load(comics())
+        self.store.update("comic", last_chapter=15, last_check_time="2026-01-01 00:00:00")
+        self.store.close()
+        items = comics()
+        app.StateStore(DB_PATH).load(items)
+        self.assertEqual(items[0]["last_chapter"], 15)
+        self.assertEqual(items[0]["last_check_time"], "2026-01-01 00:00:00")
+
+    def test_restore_from_snapshot(self):
+        self.store.load(comics())
+        self.store.update("comic", last_chapter=20)
+        self.store.export(SNAPSHOT_PATH)
+        self.store.close()
+        os.remove(DB_PATH)
+        items = comics()
+        store = app.StateStore(DB_PATH)
+        store.load(items, SNAPSHOT_PATH)
+        store.close()
+        self.assertEqual(items[0]["last_chapter"], 20)
+
+    def test_snapshot_ahead_of_database(self):
+        # 缓存中恢复的数据库比已提交的快照旧
+        self.store.load(comics())
+        self.store.update("comic", last_chapter=20)
+        self.store.export(SNAPSHOT_PATH)
+        self.store.update("comic", last_chapter=12)
+        self.store.close()
+        items = comics()
+        store = app.StateStore(DB_PATH)
+        store.load(items, SNAPSHOT_PATH)
+        store.close()
+        self.assertEqual(items[0]["last_chapter"], 20)
+
+    def test_start_chapter_changed(self):
+        self.store.load(comics())
+        self.store.update("comic", last_chapter=20)
+        self.store.export(SNAPSHOT_PATH)
+        self.store.close()
+        items = comics(last_chapter=50)
+        store = app.StateStore(DB_PATH)
+        store.load(items, SNAPSHOT_PATH)
+        store.close()
+        self.assertEqual(items[0]["last_chapter"], 50)
+
+    def test_export(self):
+        self.store.load(comics())
+        self.store.update("comic", last_chapter=11)
+        self.store.export("state.yaml")
+        snapshot = app.StateStore.read_snapshot("state.yaml")
+        self.assertEqual(snapshot["comic"]["last_chapter"], 11)
+        self.assertEqual(snapshot["comic"]["start_chapter"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+def noisy_image(path, size, image_format="JPEG"):
+    """随机噪点图片，保证缩小后字节数明显减少"""
+    rng = random.Random(size[0])
+    img = Image.frombytes("RGB", size, rng.randbytes(size[0] * size[1] * 3))
+    img.save(path, image_format, quality=95)
+
+
+class TranscodeSizeTest(unittest.TestCase):
+    def test_fit_screen(self):
+        self.assertEqual(app.transcode_size(1600, 2400, 1072, 1448), (965, 1448))
+
+    def test_no_upscale(self):
+        self.assertEqual(app.transcode_size(800, 1000, 1072, 1448), (800, 1000))
+
+    def test_long_strip(self):
+        # 条漫按屏幕宽度缩放，不缩成细线
+        self.assertEqual(app.transcode_size(800, 12000, 1072, 1448), (800, 12000))
+        self.assertEqual(app.transcode_size(2144, 20000, 1072, 1448), (1072, 10000))
+
+
+class TranscodeProfileTest(unittest.TestCase):
+    def test_profile(self):
+        self.assertIsNone(app.transcode_profile({}))
+        self.assertEqual(app.transcode_profile({"transcode": True}), app.TRANSCODE_DEFAULTS)
+        profile = app.transcode_profile({"transcode": {"grayscale": True}})
+        self.assertTrue(profile["grayscale"])
+        self.assertEqual(profile["max_width"], app.TRANSCODE_DEFAULTS["max_width"])
+
+
+class TranscodePageTest(unittest.TestCase):
+    def test_resize_and_grayscale(self):
+        noisy_image("001.jpg", (1600, 2400))
+        profile = dict(app.TRANSCODE_DEFAULTS, grayscale=True)
+        before, after, sha256 = app.transcode_page("001.jpg", profile)
+        self.assertLess(after, before)
+        with open("001.jpg", "rb") as f:
+            self.assertEqual(hashlib.sha256(f.read()).hexdigest(), sha256)
+        with Image.open("001.jpg") as img:
+            self.assertEqual(img.size, (965, 1448))
+            self.assertEqual(img.mode, "L")
+
+    def test_keep_smaller_original(self):
+        Image.new("RGB", (100, 100), "white").save("001.jpg", "JPEG", quality=10)
+        with open("001.jpg", "rb") as f:
+            original = f.read()
+        before, after, _ = app.transcode_page("001.jpg", dict(app.TRANSCODE_DEFAULTS, quality=100))
+        self.assertEqual(before, after)
+        with open("001.jpg", "rb") as f:
+            self.assertEqual(f.read(), original)
+
+
+class TranscodeChapterTest(unittest.TestCase):
+    """章节转码：更新下载清单，重新运行时跳过已转码的图片"""
+
+    def setUp(self):
+        patcher = mock.patch.object(app, "output_workers", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(app.shutdown_output_executor)
+        os.makedirs("chapter")
+        manifest = app.ChapterManifest("chapter")
+        for i in (1, 2):
+            path = os.path.join("chapter", f"{i:03d}.jpg")
+            noisy_image(path, (1200 + i, 1800))
+            with open(path, "rb") as f:
+                data = f.read()
+            manifest.record(f"{i:03d}.jpg", f"http://x/{i}", len(data), hashlib.sha256(data).hexdigest())
+        manifest.save()
+        self.meta = {"output_dir": "chapter", "chapter_name": "第1话", "contents": [{}, {}]}
+
+    def test_transcode_once(self):
+        profile = app.transcode_profile({"transcode": True})
+        self.assertTrue(app.transcode_chapter(self.meta, profile))
+        manifest = app.ChapterManifest("chapter")
+        self.assertTrue(manifest.is_complete("001.jpg") and manifest.is_complete("002.jpg"))
+        self.assertEqual(manifest.pages["001.jpg"]["url"], "http://x/1")
+
+        with mock.patch.object(app, "transcode_page") as transcode_page:
+            self.assertTrue(app.transcode_chapter(self.meta, profile))
+        transcode_page.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
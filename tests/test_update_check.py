@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise app.requests.exceptions.HTTPError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._data
+
+
+def comic2(updated, last_uuid):
+    return {"code": 200, "results": {"comic": {"datetime_updated": updated, "last_chapter": {"uuid": last_uuid}}}}
+
+
+class CheckComicUpdateTest(unittest.TestCase):
+    """快速检查：comic2接口未变化时不请求章节列表"""
+
+    def setUp(self):
+        self.index = app.ChapterIndex(os.path.join("cache", "chapter_index.db"))
+        self.responses = []
+        self.requests = []
+        self.latest = mock.Mock(return_value=12)
+        patchers = [
+            mock.patch.object(app, "chapter_index", self.index),
+            mock.patch.object(app, "quick_check_switch", 1),
+            mock.patch.object(app, "get_latest_chapter", self.latest),
+            mock.patch.object(app.http_client, "get", side_effect=self.get),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, url, params=None, headers=None):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+    def test_first_check_fetches_chapters(self):
+        self.responses.append(FakeResponse(200, comic2("2026-01-01", "u12"), {"ETag": '"v1"'}))
+        self.assertEqual(app.check_comic_update("comic"), (12, False))
+        self.assertEqual(self.index.get_marker("comic")["etag"], '"v1"')
+
+    def test_not_modified(self):
+        self.index.save_marker("comic", '"v1"', None, "2026-01-01|u12", 12)
+        self.responses.append(FakeResponse(304))
+        self.assertEqual(app.check_comic_update("comic"), (12, True))
+        self.assertEqual(self.requests, [{"If-None-Match": '"v1"'}])
+        self.latest.assert_not_called()
+
+    def test_same_fingerprint(self):
+        self.index.save_marker("comic", None, None, "2026-01-01|u12", 12)
+        self.responses.append(FakeResponse(200, comic2("2026-01-01", "u12")))
+        self.assertEqual(app.check_comic_update("comic"), (12, True))
+        self.latest.assert_not_called()
+
+    def test_changed(self):
+        self.index.save_marker("comic", None, None, "2026-01-01|u11", 11)
+        self.responses.append(FakeResponse(200, comic2("2026-01-02", "u12")))
+        self.assertEqual(app.check_comic_update("comic"), (12, False))
+        self.assertEqual(self.index.get_marker("comic")["total"], 12)
+
+    def test_error_falls_back(self):
+        self.index.save_marker("comic", None, None, "2026-01-01|u12", 12)
+        self.responses.append(FakeResponse(500))
+        self.assertEqual(app.check_comic_update("comic"), (12, False))
+        self.latest.assert_called_once_with("comic")
+
+
+class CheckAllUpdatesTest(unittest.TestCase):
+    def test_concurrent_in_order(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def check(path):
+            with lock:
+                running.append(path)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(path)
+            return int(path), False
+
+        comics = [{"path": str(i)} for i in range(8)]
+        with mock.patch.object(app, "check_comic_update", side_effect=check), \
+                mock.patch.object(app, "update_check_workers", 4):
+            results = app.check_all_updates(comics)
+        self.assertEqual(results, [(i, False) for i in range(8)])
+        self.assertGreater(max(peak), 1)
+        self.assertLessEqual(max(peak), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()